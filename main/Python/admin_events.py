@@ -0,0 +1,222 @@
+# admin_events.py
+"""管理后台实时推送（Server-Sent Events）。
+
+以前每个打开的后台标签页各自轮询 /api/stats 和 /api/activities/recent，查询量随标签页数增长。
+这里只有一个后台生产者线程，每隔 poll_interval 秒查一次统计数据和新增的访问日志，
+把变化的统计字段（stats）和新的日志（activity）作为事件广播给所有订阅者：
+- 每个订阅者一个有界队列，消费跟不上、队列满时断开该连接，浏览器带 Last-Event-ID 重连后补发；
+- 最近 history 条事件保存在内存里用于补发，补发不了（太旧或服务重启过）时发送完整快照（snapshot）；
+- 没有事件时每隔 heartbeat 秒发一行注释保持连接，断开的客户端也能及时被发现；
+- 没有订阅者时生产者不查询数据库。
+事件 ID 形如 "<epoch>:<序号>"，epoch 在进程启动和空闲后重新开始时变化，旧的 ID 一律走快照。
+"""
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+
+# 快照里带的最近活动条数，和 /api/activities/recent 一致
+RECENT_ACTIVITIES = 5
+
+
+class _Subscriber:
+
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+
+class EventBroker:
+
+    def __init__(self, stats_source, activity_source, poll_interval=5.0, heartbeat=15.0,
+                 client_buffer=64, history=256):
+        """stats_source() 返回统计字典；activity_source(after_id) 返回 id 大于 after_id 的日志（按 id 升序），
+        after_id 为 None 时返回最近 RECENT_ACTIVITIES 条"""
+        self.stats_source = stats_source
+        self.activity_source = activity_source
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.client_buffer = client_buffer
+        self._lock = threading.Lock()
+        self._prime_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._epoch = int(time.time() * 1000)
+        self._seq = 0
+        self._primed = False
+        self._stats = {}
+        self._recent = deque(maxlen=RECENT_ACTIVITIES)
+        self._last_activity_id = None
+        self.polls = 0
+        self.events = 0
+        self.overflows = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='admin-events', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    # ---------- 生产者 ----------
+    def _prime(self):
+        """没有订阅者一段时间后重新开始：取一次完整数据，旧的事件 ID 作废"""
+        with self._prime_lock:
+            if self._primed:
+                return
+            stats = self.stats_source()
+            recent = self.activity_source(None)
+            with self._lock:
+                self._epoch += 1
+                self._seq = 0
+                self._history.clear()
+                self._stats = dict(stats)
+                self._recent.clear()
+                self._recent.extend(recent)
+                self._last_activity_id = max((a['id'] for a in recent), default=0)
+                self._primed = True
+
+    def _publish(self, event_type, data):
+        with self._lock:
+            self._seq += 1
+            event = (f'{self._epoch}:{self._seq}', event_type, json.dumps(data, ensure_ascii=False))
+            self._history.append(event)
+            self.events += 1
+            for subscriber in self._subscribers:
+                if subscriber.overflowed:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.overflowed = True
+                    self.overflows += 1
+
+    def poll(self):
+        """查询一次并广播变化，返回广播的事件数"""
+        with self._lock:
+            if not self._primed:
+                return 0
+            previous = dict(self._stats)
+            after_id = self._last_activity_id
+        stats = self.stats_source()
+        activities = self.activity_source(after_id)
+        published = 0
+        delta = {key: value for key, value in stats.items() if previous.get(key) != value}
+        if delta:
+            with self._lock:
+                self._stats.update(delta)
+            self._publish('stats', delta)
+            published += 1
+        for activity in activities:
+            with self._lock:
+                self._recent.appendleft(activity)
+                self._last_activity_id = max(self._last_activity_id, activity['id'])
+            self._publish('activity', activity)
+            published += 1
+        with self._lock:
+            self.polls += 1
+        return published
+
+    def _run(self):
+        while not self._stopping.wait(self.poll_interval):
+            with self._lock:
+                idle = not self._subscribers
+                if idle:
+                    # 下一个订阅者到来时重新取完整数据，空闲期间不查询
+                    self._primed = False
+            if idle:
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f'Error polling admin events: {str(e)}')
+
+    # ---------- 订阅者 ----------
+    def _subscribe(self, last_event_id):
+        """登记订阅者，返回 (订阅者, 连接后先发出的事件)：能补发时是 last_event_id 之后的事件，否则是一个快照"""
+        subscriber = _Subscriber(self.client_buffer)
+        # 先登记再取数据，生产者不会在两步之间把状态当作空闲作废
+        with self._lock:
+            self._subscribers.add(subscriber)
+        self._prime()
+        with self._lock:
+            # 登记后入队的事件都在补发范围内，清掉避免重复
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            replay = None
+            epoch, _, seq = (last_event_id or '').partition(':')
+            if epoch == str(self._epoch) and seq.isdigit():
+                seq = int(seq)
+                oldest = self._seq - len(self._history)
+                if oldest <= seq <= self._seq:
+                    replay = list(self._history)[seq - oldest:]
+            if replay is None:
+                snapshot = (f'{self._epoch}:{self._seq}', 'snapshot', json.dumps({
+                    'stats': self._stats,
+                    'activities': list(self._recent)
+                }, ensure_ascii=False))
+                replay = [snapshot]
+        return subscriber, replay
+
+    def _unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, last_event_id=None):
+        """返回 SSE 文本的生成器；补发 last_event_id 之后的事件，补发不了时先发快照"""
+        self.start()
+
+        def format_event(event):
+            event_id, event_type, data = event
+            return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+        def generate():
+            # 在生成器里登记，响应开始发送前客户端就断开时不会留下订阅者
+            subscriber, replay = self._subscribe(last_event_id)
+            try:
+                # 断线后浏览器等待 retry 毫秒重连
+                yield f'retry: {int(self.poll_interval * 1000)}\n\n'
+                for event in replay:
+                    yield format_event(event)
+                while not subscriber.overflowed:
+                    try:
+                        event = subscriber.queue.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+                    if event is None:
+                        break
+                    yield format_event(event)
+            finally:
+                self._unsubscribe(subscriber)
+        return generate()
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(None)
+            except queue.Full:
+                subscriber.overflowed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'polls': self.polls,
+                'events': self.events,
+                'overflows': self.overflows,
+                'history': len(self._history)
+            }
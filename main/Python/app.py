@@ -1,19 +1,30 @@
 # app.py
 import sqlite3
-from flask import Flask, request, jsonify, render_template
+import json
+from flask import Flask, Response, request, jsonify, g
 import jwt
 import datetime
 import logging
 from flask_cors import CORS
-from log_activity import log_user_activity, init_logging
+from log_activity import log_user_activity, init_logging, access_log_writer
 from register import registration_bp
-from database_utils import init_db, load_user_data, save_user_data, DB_PATH
+from database_utils import (init_db, init_app, get_db, pool, load_user_data, user_repo, update_user_fields,
+                            delete_user, insert_user, StaleUserVersion)
 from user_home import user_home_bp  # 导入用户首页蓝图
 from article import article_bp
-# 确保所有JWT操作使用相同的密钥
+from uploads import upload_bp
+from auth import require_auth, encode_token
+from visit_rollup import daily_visits
+from presence import presence
+from site_stats import site_stats
+from admin_events import EventBroker, RECENT_ACTIVITIES
+import config
+# 所有JWT操作统一使用 config.SECRET_KEY
 app = Flask(__name__)
-app.secret_key = 'dev_secret_key_here'  # 必须与注册/登录使用的密钥一致
+app.secret_key = config.SECRET_KEY
+init_app(app)  # 请求结束时归还数据库连接
 app.register_blueprint(article_bp)
+app.register_blueprint(upload_bp)
 CORS(app, supports_credentials=True)
 
 
@@ -24,8 +35,6 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # 注册蓝图时使用新的蓝图名称
 app.register_blueprint(registration_bp)  # 更新为新的蓝图名称
 app.register_blueprint(user_home_bp)  # 注册新的蓝图
-# 初始化数据库
-init_db()
 
 init_logging()  # 新增初始化日志
 
@@ -46,15 +55,10 @@ def handle_login():
         login_id = data.get('login_id')
         password = data.get('password')
 
-        # 加载用户数据
-        users = load_user_data()
-        user = None
-
-        # 尝试按ID或用户名登录
-        if login_id.isdigit():
-            user = next((user for user in users['users'] if user['id'] == login_id and user['password'] == password and not user['is_banned']), None)
-        else:
-            user = next((user for user in users['users'] if user['username'] == login_id and user['password'] == password and not user['is_banned']), None)
+        # 尝试按ID或用户名登录（主键/唯一索引点查）
+        user = user_repo.get_by_login_id(login_id)
+        if user and (user['password'] != password or user['is_banned']):
+            user = None
 
         # 用户不存在或密码错误
         if not user:
@@ -69,14 +73,12 @@ def handle_login():
             'level': user['level'],
             'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=168)
         }
-        token = jwt.encode(payload, app.secret_key, algorithm='HS256')
+        token = encode_token(payload)
 
-        # 更新用户状态
+        # 更新用户状态：最后登录时间写库，在线状态只记在内存里
         user['last_login'] = datetime.datetime.now().isoformat()
-        user['is_online'] = True
-        updated_users = [u for u in users['users'] if u['id'] != user['id']]
-        updated_users.append(user)
-        save_user_data(updated_users)
+        update_user_fields(user['id'], last_login=user['last_login'])
+        presence.touch(user['id'])
 
         # 记录登录成功的日志
         log_user_activity(
@@ -109,84 +111,50 @@ def handle_login():
         return jsonify({"error": "登录失败，请检查网络连接"}), 500
 # 登出
 @app.route('/api/logout', methods=['POST'])
+@require_auth()
 def handle_logout():
+    username_val = g.current_user.get('username')
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-        users = load_user_data()
-        username = payload.get('username')
-        user = next((user for user in users['users'] if user['username'] == username), None)
-        user_id = user['id'] if user else None
-        username_val = user['username'] if user else None
+        user = user_repo.get_by_username(username_val)
         if not user:
             return jsonify({"error": "User not found"}), 404
-        user['is_online'] = False
-        updated_users = [u for u in users['users'] if u['id'] != user['id']]
-        updated_users.append(user)
-        save_user_data(updated_users)
+        user_id = user['id']
+        presence.remove(user_id)
         log_user_activity('Logout', user_id, username_val, operator_user_id=user_id, operator_username=username_val)
         return jsonify({"message": "Logout successful"})
-    except jwt.ExpiredSignatureError:
-        log_user_activity('Logout attempt with expired token', username=username_val, operator_user_id='Unknown', operator_username='Unknown')
-        return jsonify({"error": "Token已过期"}), 401
-    except jwt.InvalidTokenError:
-        log_user_activity('Logout attempt with invalid token', username=username_val, operator_user_id='Unknown', operator_username='Unknown')
-        return jsonify({"error": "无效的Token"}), 401
     except Exception as e:
         log_user_activity('Logout error', username=username_val, operator_user_id='Unknown', operator_username='Unknown')
         return jsonify({"error": str(e)}), 500
 
 # 验证Token
 @app.route('/api/validate', methods=['GET'])
+@require_auth()
 def validate_jwt_token():
-    try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({"error": "Unauthorized"}), 401
+    # 使用user_id查找用户
+    user_id = g.current_user.get('user_id')
+    user = user_repo.get_by_id(user_id)
 
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
+    if not user or user.get('is_banned', False):
+        return jsonify({"error": "User invalid"}), 401
 
-        # 使用user_id查找用户
-        user_id = payload.get('user_id')
-        users = load_user_data()
-        user = next((u for u in users['users'] if u['id'] == user_id), None)
-
-        if not user or user.get('is_banned', False):
-            return jsonify({"error": "User invalid"}), 401
-
-        return jsonify({
-            "status": "success",
-            "payload": {
-                "user_id": user['id'],
-                "display_name": user['display_name'],
-                "level": user['level'],
-                "is_online": user['is_online']
-            }
-        })
-    except jwt.ExpiredSignatureError:
-        return jsonify({"error": "Token已过期"}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "无效的Token"}), 401
+    return jsonify({
+        "status": "success",
+        "payload": {
+            "user_id": user['id'],
+            "display_name": user['display_name'],
+            "level": user['level'],
+            "is_online": presence.is_online(user['id'])
+        }
+    })
 
 # 获取当前用户
 @app.route('/api/current-user', methods=['GET'])
+@require_auth()
 def get_current_user():
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-
         # 使用user_id查找用户
-        user_id = payload.get('user_id')
-        users = load_user_data()
-        user = next((u for u in users['users'] if u['id'] == user_id), None)
+        user_id = g.current_user.get('user_id')
+        user = user_repo.get_by_id(user_id)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -197,12 +165,8 @@ def get_current_user():
             "display_name": user['display_name'],
             "level": user['level'],
             "last_login": user['last_login'],
-            "is_online": user['is_online']
+            "is_online": presence.is_online(user['id'])
         })
-    except jwt.ExpiredSignatureError:
-        return jsonify({"error": "Token expired"}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "Invalid token"}), 401
     except Exception as e:
         logging.error(f"获取当前用户失败: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
@@ -233,7 +197,8 @@ def get_members():
             created_start=created_start,
             created_end=created_end,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            online_ids=presence.online_ids()
         )
         return jsonify(data)
     except Exception as e:
@@ -242,10 +207,10 @@ def get_members():
 @app.route('/api/members/<string:id>', methods=['GET'])
 def get_member(id):
     try:
-        users = load_user_data()
-        user = next((user for user in users['users'] if user['id'] == id), None)
+        user = user_repo.get_by_id(id)
         if not user:
             return jsonify({"error": "成员未找到"}), 404
+        user['is_online'] = 1 if presence.is_online(user['id']) else 0
         return jsonify(user)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -262,50 +227,32 @@ def add_member():
         phone = data.get('phone', '')
         email = data.get('email', '')
         is_banned = data.get('is_banned', False)
-        created_at = datetime.datetime.now().isoformat()
-        is_online = False
 
-        users = load_user_data()
-        if any(user['username'] == username for user in users['users']):
+        if user_repo.get_by_username(username):
             return jsonify({"error": "用户名已存在"}), 400
 
-        # 原错误代码：new_id = str(len(users['users']) + 1)
-        # 改为获取最大ID+1
-        max_id = max(int(user['id']) for user in users['users']) if users['users'] else 0
-        new_id = str(max_id + 1)
-
-        new_user = {
-            'id': new_id,  # 使用新的ID生成方式
-            'username': username,
-            'display_name': display_name,
-            'password': password,
-            'level': level,
-            'phone': phone,
-            'email': email,
-            'is_banned': is_banned,
-            'last_login': None,
-            'created_at': created_at,
-            'is_online': is_online
-        }
-        users['users'].append(new_user)
-        save_user_data(users['users'])
+        # ID 在插入事务内按最大ID+1分配
+        with site_stats.writing():
+            try:
+                new_user = insert_user(username, display_name, password, level=level, phone=phone,
+                                       email=email, is_banned=is_banned)
+            except sqlite3.IntegrityError:
+                return jsonify({"error": "用户名已存在"}), 400
+            site_stats.user_added(new_user['is_banned'])
+        new_id = new_user['id']
         log_user_activity('Add member', new_id, display_name, operator_user_id='id', operator_username='username')
         return jsonify(new_user), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/members/<string:id>/ban', methods=['POST'])
+@require_auth()
 def ban_member(id):
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
+        payload = g.current_user
         current_user_level = payload.get('level')
 
-        users = load_user_data()
-        user = next((user for user in users['users'] if user['id'] == id), None)
+        user = user_repo.get_by_id(id)
         if not user:
             return jsonify({"error": "成员未找到"}), 404
 
@@ -313,13 +260,16 @@ def ban_member(id):
             return jsonify({"error": "权限不足，无法封禁该用户"}), 403
 
         user['is_banned'] = not user['is_banned']
-        updated_users = [u for u in users['users'] if u['id'] != id]
-        updated_users.append(user)
-        save_user_data(updated_users)
+        try:
+            with site_stats.writing():
+                if update_user_fields(id, expected_version=user['version'], is_banned=int(user['is_banned'])):
+                    site_stats.user_banned(user['is_banned'])
+        except StaleUserVersion:
+            return jsonify({"error": "该成员已被其他操作修改，请刷新后重试"}), 409
 
         # 记录操作日志
         action = 'Unban member' if not user['is_banned'] else 'Ban member'
-        log_user_activity(action, user['id'], user['username'], operator_user_id=payload.get('id'), operator_username=payload.get('username'))
+        log_user_activity(action, user['id'], user['username'], operator_user_id=payload.get('user_id'), operator_username=payload.get('username'))
 
         return jsonify({
             'unbanned': not user['is_banned'],
@@ -330,39 +280,36 @@ def ban_member(id):
 
 # 删除成员
 @app.route('/api/members/<string:id>/delete', methods=['DELETE'])
+@require_auth()
 def delete_member(id):
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
+        payload = g.current_user
         current_user_level = payload.get('level')
 
-        users = load_user_data()
         # 注意：id 本身就是字符串，不再 int(id)
-        user = next((u for u in users['users'] if u['id'] == id), None)
+        user = user_repo.get_by_id(id)
         if not user:
             return jsonify({"error": "成员未找到"}), 404
 
         if current_user_level <= user['level']:
             return jsonify({"error": "权限不足，无法删除该用户"}), 403
 
-        updated_users = [u for u in users['users'] if u['id'] != id]
-        save_user_data(updated_users)
-        log_user_activity('Delete member', user['id'], user['username'], operator_user_id=payload.get('id'), operator_username=payload.get('username'))
+        try:
+            with site_stats.writing():
+                if delete_user(id, expected_version=user['version']):
+                    site_stats.user_removed(user['is_banned'])
+        except StaleUserVersion:
+            return jsonify({"error": "该成员已被其他操作修改，请刷新后重试"}), 409
+        log_user_activity('Delete member', user['id'], user['username'], operator_user_id=payload.get('user_id'), operator_username=payload.get('username'))
         return jsonify({"message": f"成员 {user['display_name']} 已删除"})
     except Exception as e:
         logging.error(f"删除成员错误: {e}")
         return jsonify({"error": str(e)}), 500
 @app.route('/api/members/<string:id>/edit', methods=['POST'])
+@require_auth()
 def edit_member(id):
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-        token = auth_header.split(' ')[1]
-        payload = jwt.decode(token, app.secret_key, algorithms=['HS256'])
+        payload = g.current_user
         current_user_level = payload.get('level')
 
         data = request.get_json()
@@ -372,103 +319,179 @@ def edit_member(id):
         email = data.get('email')
         level = data.get('level')
 
-        users = load_user_data()
-        user = next((user for user in users['users'] if user['id'] == id), None)
+        user = user_repo.get_by_id(id)
         if not user:
             return jsonify({"error": "成员未找到"}), 404
 
         if current_user_level <= user['level']:
             return jsonify({"error": "权限不足，无法编辑该用户"}), 403
 
-        user['username'] = username or user['username']
-        user['display_name'] = display_name or user['display_name']
-        user['phone'] = phone or user['phone']
-        user['email'] = email or user['email']
-        user['level'] = level or user['level']
-
-        updated_users = [u for u in users['users'] if u['id'] != user['id']]
-        updated_users.append(user)
-        save_user_data(updated_users)
+        changes = {
+            'username': username or user['username'],
+            'display_name': display_name or user['display_name'],
+            'phone': phone or user['phone'],
+            'email': email or user['email'],
+            'level': level or user['level']
+        }
+        try:
+            update_user_fields(id, expected_version=user['version'], **changes)
+        except StaleUserVersion:
+            return jsonify({"error": "该成员已被其他操作修改，请刷新后重试"}), 409
+        except sqlite3.IntegrityError:
+            return jsonify({"error": "用户名已存在"}), 400
+        user.update(changes)
+        user['version'] += 1
 
         # 记录操作日志
-        log_user_activity('Edit member', user['id'], user['username'], operator_user_id=payload.get('id'), operator_username=payload.get('username'))
+        log_user_activity('Edit member', user['id'], user['username'], operator_user_id=payload.get('user_id'), operator_username=payload.get('username'))
 
         return jsonify(user)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+LOG_PAGE_SIZE = 100
+LOG_PAGE_SIZE_MAX = 1000
+LOG_COLUMNS = ('id', 'user_id', 'username', 'operator_user_id', 'operator_username', 'action',
+               'ip_address', 'browser', 'device_type', 'access_time', 'location')
+
+
+def _log_time_bound(value, is_end):
+    # 只有日期时，结束时间按整天计算（取次日零点作为开区间上界）
+    try:
+        day = datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return value
+    if is_end:
+        day += datetime.timedelta(days=1)
+    return day.strftime('%Y-%m-%d')
+
+
+def _build_log_query(args):
+    """根据查询参数构建日志查询：按 id 倒序的游标分页 + 服务端筛选"""
+    sql = f"SELECT {', '.join(LOG_COLUMNS)} FROM access_logs WHERE 1=1"
+    params = []
+
+    before_id = args.get('before_id', type=int)
+    if before_id is not None:
+        sql += ' AND id < ?'
+        params.append(before_id)
+
+    user = args.get('user')
+    if user:
+        sql += ' AND (user_id = ? OR username = ?)'
+        params.extend([user, user])
+
+    for arg, column in (('action', 'action'), ('ip', 'ip_address'), ('device', 'device_type')):
+        value = args.get(arg)
+        if value:
+            sql += f' AND {column} = ?'
+            params.append(value)
+
+    start = args.get('start')
+    if start:
+        sql += ' AND access_time >= ?'
+        params.append(_log_time_bound(start, False))
+    end = args.get('end')
+    if end:
+        sql += ' AND access_time < ?'
+        params.append(_log_time_bound(end, True))
+
+    # id 自增且与写入时间同序，按 id 倒序即按时间倒序
+    sql += ' ORDER BY id DESC'
+    return sql, params
+
+
+def _stream_logs(sql, params):
+    """NDJSON 流式输出：每次只从游标取一小批，内存占用与日志总量无关"""
+    def generate():
+        # 生成器在视图返回后才执行，此时应用上下文已结束，单独从连接池借连接
+        with pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.dumps(dict(zip(LOG_COLUMNS, row)), ensure_ascii=False) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
+    """查询参数：before_id/limit 游标分页；user、action、ip、device、start、end 筛选；
+    format=ndjson 时流式返回全部匹配记录（可再用 limit 限制条数）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # 查询访问日志表
-        cursor.execute('SELECT * FROM access_logs ORDER BY access_time DESC')
+        sql, params = _build_log_query(request.args)
+        limit = request.args.get('limit', type=int)
+        stream = request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == 'application/x-ndjson'
+
+        if stream:
+            if limit:
+                sql += ' LIMIT ?'
+                params.append(limit)
+            return _stream_logs(sql, params)
+
+        limit = min(max(limit or LOG_PAGE_SIZE, 1), LOG_PAGE_SIZE_MAX)
+        # 多取一条用来判断是否还有下一页
+        cursor = get_db().cursor()
+        cursor.execute(sql + ' LIMIT ?', params + [limit + 1])
         rows = cursor.fetchall()
 
-        # 转换为字典格式
-        logs = []
-        for row in rows:
-            log = {
-                'id': row[0],
-                'user_id': row[1],
-                'username': row[2],
-                'operator_user_id': row[3],
-                'operator_username': row[4],
-                'action': row[5],
-                'ip_address': row[6],
-                'browser': row[7],
-                'device_type': row[8],
-                'access_time': row[9],
-                'location': row[10]
-            }
-            logs.append(log)
-
-        conn.close()
-        return jsonify(logs)
+        logs = [dict(zip(LOG_COLUMNS, row)) for row in rows[:limit]]
+        response = jsonify(logs)
+        if len(rows) > limit:
+            # 下一页游标放在响应头里，响应体保持数组格式以兼容现有页面
+            response.headers['X-Next-Before-Id'] = str(logs[-1]['id'])
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+# 访问日志异步写入状态（已入队/待写入/丢弃/已写入）
+@app.route('/api/logs/writer-stats', methods=['GET'])
+@require_auth()
+def get_log_writer_stats():
+    return jsonify(access_log_writer.stats())
+
+# 在线心跳：前端登录后定时调用，超过 PRESENCE_TTL_SECONDS 没有心跳算作离线
+@app.route('/api/presence/heartbeat', methods=['POST'])
+@require_auth()
+def presence_heartbeat():
+    presence.touch(g.current_user.get('user_id'))
+    return jsonify({"status": "online", "ttl": presence.ttl})
+
+# 在线状态统计（在线/跟踪中/心跳次数/过期清理）
+@app.route('/api/presence/stats', methods=['GET'])
+@require_auth()
+def get_presence_stats():
+    return jsonify(presence.stats())
+
+def dashboard_stats():
+    # 在线/注册/封禁人数、各状态文章数、今日访问量都从内存计数读取，不查询数据库
+    return site_stats.snapshot()
+
 # 获取统计数据
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     try:
-        # 获取在线人数
-        online_users = len([user for user in load_user_data()['users'] if user.get('is_online', False)])
-
-        # 获取注册人数
-        registered_users = len(load_user_data()['users'])
-
-        # 获取文章总数（这里先返回固定值，后续可以接入实际数据）
-        article_count = 42
-
-        # 获取今日访问量
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM access_logs WHERE date(access_time) = ?', (today,))
-        today_visits = cursor.fetchone()[0]
-        conn.close()
-
-        return jsonify({
-            "online_users": online_users,
-            "registered_users": registered_users,
-            "article_count": article_count,
-            "today_visits": today_visits
-        })
+        stats = dashboard_stats()
+        response = jsonify(stats)
+        # 数值有变化时 version 才会变，未变化返回 304
+        response.set_etag(f"stats-{stats['version']}")
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# 统计计数的对账状态（版本/对账次数/修正次数/上次对账时间）
+@app.route('/api/stats/service-stats', methods=['GET'])
+@require_auth()
+def get_site_stats_status():
+    return jsonify(site_stats.stats())
+
 
 @app.route('/api/visits/weekly', methods=['GET'])
+@require_auth()
 def get_weekly_visits():
     try:
-        # 验证 JWT 令牌
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-        token = auth_header.split(' ')[1]
-        jwt.decode(token, app.secret_key, algorithms=['HS256'])
-
         # 计算最近7天的日期
         end_date = datetime.datetime.now()
         start_date = end_date - datetime.timedelta(days=6)
@@ -480,78 +503,71 @@ def get_weekly_visits():
             date_list.append(current_date.strftime('%Y-%m-%d'))
             current_date += datetime.timedelta(days=1)
 
-        # 查询数据库
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # 获取每日访问量
-        daily_visits = []
-        for date_str in date_list:
-            cursor.execute('SELECT COUNT(*) FROM access_logs WHERE date(access_time) = ?', (date_str,))
-            count = cursor.fetchone()[0]
-            daily_visits.append(count)
-
-        conn.close()
+        # 获取每日访问量：读取按天汇总表，只有7行
+        counts = daily_visits(date_list[0], date_list[-1])
+        visits = [counts.get(date_str, 0) for date_str in date_list]
 
         return jsonify({
             "dates": date_list,
-            "visits": daily_visits,
-            "total": sum(daily_visits)
+            "visits": visits,
+            "total": sum(visits)
         })
-    except jwt.ExpiredSignatureError:
-        return jsonify({"error": "Token已过期"}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "无效的Token"}), 401
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/activities/recent', methods=['GET'])
+@require_auth()
 def get_recent_activities():
     try:
-        # 验证JWT令牌
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({"error": "Unauthorized"}), 401
-
-        token = auth_header.split(' ')[1]
-        jwt.decode(token, app.secret_key, algorithms=['HS256'])
-
-        # 查询数据库获取最近5条日志
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM access_logs 
-            ORDER BY access_time DESC 
-            LIMIT 5
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-
-        # 转换为字典格式
-        logs = []
-        for row in rows:
-            log = {
-                'id': row[0],
-                'user_id': row[1],
-                'username': row[2],
-                'operator_user_id': row[3],
-                'operator_username': row[4],
-                'action': row[5],
-                'ip_address': row[6],
-                'browser': row[7],
-                'device_type': row[8],
-                'access_time': row[9],
-                'location': row[10]
-            }
-            logs.append(log)
-
-        return jsonify(logs)
-    except jwt.ExpiredSignatureError:
-        return jsonify({"error": "Token已过期"}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({"error": "无效的Token"}), 401
+        # 最近5条日志，最新的在前
+        return jsonify(recent_activities())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def recent_activities(after_id=None):
+    """after_id 为空时返回最近的日志（新的在前）；否则返回 id 大于 after_id 的日志（旧的在前）"""
+    columns = ', '.join(LOG_COLUMNS)
+    # 后台推送线程里没有应用上下文，直接从连接池借连接
+    with pool.connection() as conn:
+        if after_id is None:
+            rows = conn.execute(f'SELECT {columns} FROM access_logs ORDER BY id DESC LIMIT ?',
+                                (RECENT_ACTIVITIES,)).fetchall()
+        else:
+            # 一次最多推送 100 条，其余的下一轮再推
+            rows = conn.execute(f'SELECT {columns} FROM access_logs WHERE id > ? ORDER BY id LIMIT 100',
+                                (after_id,)).fetchall()
+    return [dict(zip(LOG_COLUMNS, row)) for row in rows]
+
+
+# 所有后台标签页共用一个生产者，查询次数与打开的标签页数无关
+admin_events = EventBroker(
+    dashboard_stats,
+    recent_activities,
+    poll_interval=config.ADMIN_EVENTS_POLL_SECONDS,
+    heartbeat=config.ADMIN_EVENTS_HEARTBEAT_SECONDS,
+    client_buffer=config.ADMIN_EVENTS_CLIENT_BUFFER
+)
+
+
+# 控制台实时推送（SSE）：snapshot 为完整数据，stats 为变化的统计字段，activity 为新的访问日志
+@app.route('/api/admin/events', methods=['GET'])
+@require_auth(allow_query_token=True)
+def stream_admin_events():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(admin_events.stream(last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 关闭 nginx 的响应缓冲，事件才能立即送达
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/admin/events/stats', methods=['GET'])
+@require_auth()
+def get_admin_events_stats():
+    return jsonify(admin_events.stats())
 if __name__ == '__main__':
+    # 启动前执行未完成的数据库迁移（也可以单独运行 python manage.py migrate）
+    init_db()
     app.run(debug=True, port=5000)
\ No newline at end of file
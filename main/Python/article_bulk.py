@@ -0,0 +1,147 @@
+# article_bulk.py
+"""批量重新渲染：模板或 Markdown 扩展变化后，用多进程重新生成全部文章的 HTML。
+
+每篇文章计算 (Markdown 哈希, 模板哈希, 扩展配置) 指纹，与 articles.render_fingerprint
+相同且 HTML 已存在时跳过；同时清理没有对应文章的 HTML。
+正文的读写都在主进程通过 article.storage 完成；Markdown 交给专用的渲染进程池，
+与在线渲染一样受超时和大小上限约束，个别异常文章只会失败，不会卡住整个批次。
+命令行入口：python manage.py rerender
+"""
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import article
+from article_render import RENDER_READY, RENDER_FAILED
+
+RENDERED = 'rendered'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+MISSING = 'missing'
+
+# 渲染结果攒够这么多篇写入一次，避免长时间占用写锁
+WRITE_BATCH = 64
+# 每个渲染线程最多预读这么多篇正文，内存占用与文章总数无关
+IN_FLIGHT_PER_WORKER = 4
+
+
+def _render_job(job, sandbox):
+    """在线程池里执行，返回 (文章ID, 结果, 指纹, HTML, 错误信息)"""
+    article_id, title, author_name, created_at, content, stored_fingerprint, has_html, force = job
+    try:
+        fingerprint = article.render_fingerprint(content)
+        if not force and fingerprint == stored_fingerprint and has_html:
+            return article_id, SKIPPED, fingerprint, None, None
+        page = article.render_page(content, title, author_name, created_at, sandbox=sandbox)
+        return article_id, RENDERED, fingerprint, page, None
+    except Exception as e:
+        return article_id, FAILED, None, None, str(e)
+
+
+def _read_jobs(conn, rows, html_ids, force):
+    """逐篇读取正文生成任务；正文缺失的文章直接作为失败结果产出"""
+    for row in rows:
+        body = article.storage.read(conn, row['id'], 'md')
+        if body is None:
+            yield None, (row['id'], MISSING, None, None, f"Markdown正文不存在: {row['id']}")
+            continue
+        yield (row['id'], row['title'], row['author_name'], row['created_at'], body.text,
+               row['render_fingerprint'], row['id'] in html_ids, force), None
+
+
+def _flush(conn, results, updated_at):
+    """写入一批渲染结果。渲染期间被编辑过的文章 updated_at 已变，不覆盖在线渲染写入的 HTML 和状态"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for article_id, result, fingerprint, html in results:
+            current = conn.execute('SELECT updated_at FROM articles WHERE id = ?', (article_id,)).fetchone()
+            if current is None or current[0] != updated_at[article_id]:
+                continue
+            if html is not None:
+                article.storage.write(conn, article_id, 'html', html)
+            status = RENDER_READY if result in (RENDERED, SKIPPED) else RENDER_FAILED
+            conn.execute('UPDATE articles SET render_status = ?, render_fingerprint = ? WHERE id = ?',
+                         (status, fingerprint, article_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rerender_all(conn, workers=None, force=False, progress=None):
+    """重新渲染全部文章，返回统计信息。progress(已完成, 总数, 每秒篇数) 大约每秒调用一次"""
+    storage = article.storage
+    rows = conn.execute('''
+        SELECT id, title, author_name, created_at, updated_at, md_path, html_path, render_fingerprint
+        FROM articles
+    ''').fetchall()
+    updated_at = {row['id']: row['updated_at'] for row in rows}
+    html_ids = storage.list_ids(conn, 'html')
+
+    counts = Counter()
+    errors = []
+    pending = []
+    started = last_report = time.perf_counter()
+
+    def collect(article_id, result, fingerprint, html, error):
+        nonlocal last_report
+        counts[result] += 1
+        if error:
+            errors.append((article_id, error))
+        pending.append((article_id, result, fingerprint, html))
+        if len(pending) >= WRITE_BATCH:
+            _flush(conn, pending, updated_at)
+            pending.clear()
+        now = time.perf_counter()
+        if progress and now - last_report >= 1:
+            done = sum(counts.values())
+            progress(done, len(rows), done / (now - started))
+            last_report = now
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    sandbox = article.create_render_sandbox(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 边读边提交：已读出正文、还没收回结果的文章不超过 max_in_flight 篇，满了先收回最早的一篇
+            in_flight = deque()
+            for job, missing in _read_jobs(conn, rows, html_ids, force):
+                if missing:
+                    collect(*missing)
+                    continue
+                in_flight.append(executor.submit(_render_job, job, sandbox))
+                if len(in_flight) >= max_in_flight:
+                    collect(*in_flight.popleft().result())
+            while in_flight:
+                collect(*in_flight.popleft().result())
+    finally:
+        sandbox.shutdown()
+    if pending:
+        _flush(conn, pending, updated_at)
+    elapsed = time.perf_counter() - started
+
+    # 路径为空的旧数据按存储后端的地址补齐，并清理没有对应文章的 HTML；Markdown 是原始数据，只统计不删除
+    ids = set(updated_at)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('UPDATE articles SET md_path = ?, html_path = ? WHERE id = ?',
+                         [(storage.public_path(row['id'], 'md'), storage.public_path(row['id'], 'html'), row['id'])
+                          for row in rows if not row['md_path'] or not row['html_path']])
+        removed = storage.delete_orphans(conn, ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    orphan_md = sorted(storage.list_ids(conn, 'md') - ids)
+
+    return {
+        'total': len(rows),
+        'rendered': counts[RENDERED],
+        'skipped': counts[SKIPPED],
+        'failed': counts[FAILED] + counts[MISSING],
+        'errors': errors,
+        'orphans_removed': removed,
+        'orphan_md': orphan_md,
+        'seconds': elapsed,
+        'per_second': len(rows) / elapsed if elapsed else 0.0
+    }
@@ -0,0 +1,116 @@
+# article_cache.py
+"""文章正文内存缓存：LRU 淘汰、按总字节数限制容量，附带内容哈希与修改时间，
+用于生成 ETag / Last-Modified 并响应 304"""
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from flask import request, Response
+
+
+class CachedBody:
+    __slots__ = ('text', 'etag', 'mtime', 'size')
+
+    def __init__(self, text, mtime):
+        data = text.encode('utf-8')
+        self.text = text
+        self.etag = hashlib.sha256(data).hexdigest()
+        self.mtime = mtime
+        self.size = len(data)
+
+    @property
+    def last_modified(self):
+        return datetime.datetime.fromtimestamp(int(self.mtime), tz=datetime.timezone.utc)
+
+
+class ArticleCache:
+    """键为 (文章ID, 类型)，类型为 'html' 或 'md'；文章写入/删除时调用 invalidate 失效。
+
+    未命中的读者先取 generation(文章ID)，读完正文后带着它调用 put；
+    读的过程中文章被保存并 invalidate 过，代数已经变了，put 不会把旧正文放回缓存。
+    代数按文章ID分到固定数量的槽里，不随文章数增长；不同文章落在同一个槽只会让 put 偶尔跳过一次缓存"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, generation_slots=256):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._generations = [0] * generation_slots
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _slot(self, article_id):
+        return hash(article_id) % len(self._generations)
+
+    def generation(self, article_id):
+        with self._lock:
+            return self._generations[self._slot(article_id)]
+
+    def put(self, key, text, mtime, generation=None):
+        """缓存并返回条目；generation 与当前代数不同（读取期间被 invalidate 过）时只返回条目不缓存"""
+        entry = CachedBody(text, mtime)
+        # 单个正文超过总容量时不缓存
+        if entry.size > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self._generations[self._slot(key[0])]:
+                return entry
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+        return entry
+
+    def invalidate(self, article_id):
+        with self._lock:
+            self._generations[self._slot(article_id)] += 1
+            for key in [k for k in self._entries if k[0] == article_id]:
+                self.total_bytes -= self._entries.pop(key).size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def cached_response(entry, build, variant=''):
+    """带强 ETag 和 Last-Modified 返回 build(entry) 的结果；
+    If-None-Match 命中或 If-Modified-Since 不早于修改时间时直接返回 304，不生成响应体。
+    同一正文的不同表示（HTML/JSON）用 variant 区分 ETag"""
+    etag = entry.etag + (f'-{variant}' if variant else '')
+    last_modified = entry.last_modified
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and last_modified <= since
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = build(entry)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # 允许缓存但每次都要回源校验
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
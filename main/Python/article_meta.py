@@ -0,0 +1,129 @@
+# article_meta.py
+"""文章派生信息：字数、阅读时长、目录和摘要。
+
+保存文章时从 Markdown 提取一次写入 articles 表，列表和详情接口直接返回，
+不用再读取正文。只做轻量的逐行扫描，不调用 Markdown 渲染。
+"""
+import re
+import json
+import math
+
+# 中文按字、其他语言按词计数
+CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]')
+WORD_RE = re.compile(r'[A-Za-z0-9\u00c0-\u024f]+(?:[\'\u2019.-][A-Za-z0-9\u00c0-\u024f]+)*')
+# 每分钟阅读量
+CJK_PER_MINUTE = 300
+WORDS_PER_MINUTE = 200
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+ATX_HEADING_RE = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+SETEXT_RE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+# 段落开头的块标记：引用、列表项
+BLOCK_PREFIX_RE = re.compile(r'^ {0,3}(?:>[ \t]?)*(?:(?:[*+-]|\d+\.)[ \t]+)?')
+HR_RE = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+TABLE_RE = re.compile(r'^ {0,3}\|')
+
+# 行内标记，按顺序替换成纯文本
+INLINE_RES = (
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),        # 图片
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),         # 链接
+    (re.compile(r'\[([^\]]*)\]\[[^\]]*\]'), r'\1'),        # 引用式链接
+    (re.compile(r'<[^>\n]+>'), ''),                         # HTML 标签
+    (re.compile(r'(`+)(.+?)\1'), r'\2'),                   # 行内代码
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),              # 加粗
+    (re.compile(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1'), r'\2'),  # 强调
+)
+
+EXCERPT_CHARS = 120
+TOC_MAX_ENTRIES = 100
+
+
+def plain_text(line):
+    for pattern, repl in INLINE_RES:
+        line = pattern.sub(repl, line)
+    return line.strip()
+
+
+def count_words(text):
+    cjk = len(CJK_RE.findall(text))
+    return cjk, len(WORD_RE.findall(CJK_RE.sub(' ', text)))
+
+
+def extract(content):
+    """返回 {'word_count', 'reading_minutes', 'toc', 'excerpt'}；toc 为 [{'level', 'text'}]"""
+    lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    cjk = words = 0
+    toc = []
+    excerpt = None
+    paragraph = []
+    fence = None
+
+    def end_paragraph():
+        nonlocal excerpt
+        if paragraph and excerpt is None:
+            excerpt = ' '.join(paragraph)
+        paragraph.clear()
+
+    for i, line in enumerate(lines):
+        if fence:
+            # 代码也算阅读量，但不进入目录和摘要
+            if line.rstrip() == fence:
+                fence = None
+            else:
+                c, w = count_words(line)
+                cjk, words = cjk + c, words + w
+            continue
+        match = FENCE_RE.match(line)
+        if match:
+            end_paragraph()
+            fence = match.group(1)
+            continue
+        if not line.strip() or HR_RE.match(line) and not paragraph:
+            end_paragraph()
+            continue
+
+        heading = ATX_HEADING_RE.match(line)
+        if heading:
+            end_paragraph()
+            level, text = len(heading.group(1)), plain_text(heading.group(2) or '')
+            c, w = count_words(text)
+            cjk, words = cjk + c, words + w
+        elif paragraph and len(paragraph) == 1 and SETEXT_RE.match(line) and not TABLE_RE.match(lines[i - 1]):
+            # 上一行是 setext 标题（字数已经算过），撤回它在摘要里的位置
+            level, text = (1 if line.strip()[0] == '=' else 2), paragraph.pop()
+        else:
+            text = plain_text(BLOCK_PREFIX_RE.sub('', line, count=1))
+            c, w = count_words(text)
+            cjk, words = cjk + c, words + w
+            if text and not TABLE_RE.match(line) and not line.startswith(('    ', '\t')):
+                paragraph.append(text)
+            continue
+
+        if text and len(toc) < TOC_MAX_ENTRIES:
+            toc.append({'level': level, 'text': text})
+    end_paragraph()
+
+    excerpt = excerpt or ''
+    if len(excerpt) > EXCERPT_CHARS:
+        excerpt = excerpt[:EXCERPT_CHARS].rstrip() + '…'
+    minutes = cjk / CJK_PER_MINUTE + words / WORDS_PER_MINUTE
+    return {
+        'word_count': cjk + words,
+        'reading_minutes': max(1, math.ceil(minutes)) if cjk + words else 0,
+        'toc': toc,
+        'excerpt': excerpt
+    }
+
+
+def store(conn, article_id, content):
+    """在调用方的事务里重新计算并写入文章的派生信息（不提交）"""
+    meta = extract(content)
+    conn.execute('''
+        UPDATE articles SET word_count = ?, reading_minutes = ?, toc = ?, excerpt = ? WHERE id = ?
+    ''', (meta['word_count'], meta['reading_minutes'], json.dumps(meta['toc'], ensure_ascii=False),
+          meta['excerpt'], article_id))
+    return meta
+
+
+def load_toc(value):
+    return json.loads(value) if value else []
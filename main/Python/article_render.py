@@ -0,0 +1,119 @@
+# article_render.py
+"""文章后台渲染队列：写接口只保存 Markdown 并入队，由线程池生成 HTML 文件。
+
+同一篇文章的任务会合并：排队中的任务不会重复提交；正在渲染时又有新提交，
+则本次渲染结束后再渲染一次，保证最终生成的是最新内容。
+渲染函数由调用方提供（见 article.render_article_html），本模块只负责调度。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# articles.render_status 取值
+RENDER_PENDING = 'pending'
+RENDER_READY = 'ready'
+RENDER_FAILED = 'failed'
+
+
+class RenderQueue:
+
+    def __init__(self, render_func, workers=2, lock_stripes=64):
+        self.render_func = render_func
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # 文章ID -> 状态：'queued' 已入队未开始，'running' 渲染中，'rerun' 渲染中且有新提交
+        self._jobs = {}
+        # 按文章ID分到固定数量的锁上，后台渲染和请求内的按需渲染不会同时写同一个文件；
+        # 锁的数量不随文章数增长，不同文章偶尔共用一把锁只是多等一次渲染
+        self._article_locks = [threading.Lock() for _ in range(lock_stripes)]
+        # 防抖中的提交：文章ID -> Timer
+        self._timers = {}
+        self.rendered = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='article-render')
+        return self._executor
+
+    def _article_lock(self, article_id):
+        return self._article_locks[hash(article_id) % len(self._article_locks)]
+
+    def submit(self, article_id, delay=0):
+        """提交渲染；delay 大于 0 时防抖，delay 秒内的连续提交只在最后一次之后渲染一次"""
+        if delay > 0:
+            with self._lock:
+                timer = self._timers.pop(article_id, None)
+                if timer is not None:
+                    timer.cancel()
+                    self.coalesced += 1
+                timer = threading.Timer(delay, self._fire, (article_id,))
+                # 进程退出时丢弃未触发的渲染，文章保持 pending，查看时会按需渲染
+                timer.daemon = True
+                self._timers[article_id] = timer
+            timer.start()
+            return
+
+        with self._lock:
+            state = self._jobs.get(article_id)
+            if state is not None:
+                if state == 'running':
+                    self._jobs[article_id] = 'rerun'
+                self.coalesced += 1
+                return
+            self._jobs[article_id] = 'queued'
+            executor = self._ensure_executor()
+        executor.submit(self._run, article_id)
+
+    def _fire(self, article_id):
+        with self._lock:
+            self._timers.pop(article_id, None)
+        self.submit(article_id)
+
+    def _run(self, article_id):
+        while True:
+            with self._lock:
+                self._jobs[article_id] = 'running'
+            self.render_now(article_id)
+            with self._lock:
+                if self._jobs.get(article_id) != 'rerun':
+                    self._jobs.pop(article_id, None)
+                    return
+
+    def render_now(self, article_id, **kwargs):
+        """在当前线程同步渲染，返回是否成功；失败只记录日志，由渲染函数负责标记状态。
+        kwargs 原样传给渲染函数"""
+        with self._article_lock(article_id):
+            try:
+                self.render_func(article_id, **kwargs)
+                self.rendered += 1
+                return True
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"渲染文章 {article_id} 失败: {str(e)}")
+                return False
+
+    def is_queued(self, article_id):
+        with self._lock:
+            return article_id in self._jobs or article_id in self._timers
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._jobs),
+                'debouncing': len(self._timers),
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'coalesced': self.coalesced
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
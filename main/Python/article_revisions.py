@@ -0,0 +1,232 @@
+# article_revisions.py
+"""文章历史版本：正文按内容哈希存成 zlib 压缩的 blob，版本表只记录引用。
+
+- 相同正文只存一份（内容寻址）；
+- 新正文相对同一文章的上一个版本做按行差分，只存变化的行，存储量与修改量成正比；
+- 差分链最长 MAX_DELTA_DEPTH 层，超过后存一份完整正文，恢复任意版本最多回放这么多层；
+- 差分比完整正文还大时直接存完整正文。
+"""
+import json
+import zlib
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_DELTA_DEPTH = 16
+# 最近还原过的正文，内容寻址所以永远不会过期
+TEXT_CACHE_SIZE = 64
+
+_text_cache = OrderedDict()
+_text_cache_lock = threading.Lock()
+
+
+def create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS revision_blobs (
+            hash TEXT PRIMARY KEY,
+            base_hash TEXT,
+            depth INTEGER NOT NULL DEFAULT 0,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL,
+            blob_hash TEXT NOT NULL,
+            title TEXT,
+            author_id TEXT,
+            author_name TEXT,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_revisions_article ON article_revisions(article_id, id)')
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# ---------- 差分编码 ----------
+def _make_delta(base, text):
+    """[[起始行, 结束行], "插入的文本", ...]：数字区间表示复制基准正文的行，字符串为新增内容"""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(lines[j1:j2]))
+    return ops
+
+
+def _apply_delta(base, ops):
+    base_lines = base.splitlines(keepends=True)
+    return ''.join(''.join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+def _cache_text(blob_hash, text):
+    with _text_cache_lock:
+        _text_cache[blob_hash] = text
+        _text_cache.move_to_end(blob_hash)
+        while len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+
+
+def load_text(conn, blob_hash):
+    """还原 blob 对应的完整正文"""
+    # 沿差分链向前找到缓存命中或完整正文，chain 记录沿途的差分（从新到旧）
+    chain = []
+    current = blob_hash
+    while True:
+        with _text_cache_lock:
+            text = _text_cache.get(current)
+        if text is not None:
+            break
+        row = conn.execute('SELECT base_hash, data FROM revision_blobs WHERE hash = ?', (current,)).fetchone()
+        if row is None:
+            raise KeyError(f'版本数据不存在: {current}')
+        if row[0] is None:
+            text = zlib.decompress(row[1]).decode('utf-8')
+            _cache_text(current, text)
+            break
+        chain.append((current, row[1]))
+        current = row[0]
+
+    # 从完整正文开始依次应用差分
+    for delta_hash, data in reversed(chain):
+        text = _apply_delta(text, json.loads(zlib.decompress(data)))
+        _cache_text(delta_hash, text)
+    return text
+
+
+def store_blob(conn, text, base_hash=None):
+    """保存正文（已存在则直接复用），返回内容哈希。base_hash 为差分基准"""
+    blob_hash = text_hash(text)
+    if conn.execute('SELECT 1 FROM revision_blobs WHERE hash = ?', (blob_hash,)).fetchone():
+        return blob_hash
+
+    full = zlib.compress(text.encode('utf-8'))
+    data, depth = full, 0
+    if base_hash is not None:
+        row = conn.execute('SELECT depth FROM revision_blobs WHERE hash = ?', (base_hash,)).fetchone()
+        if row is not None and row[0] < MAX_DELTA_DEPTH:
+            delta = zlib.compress(json.dumps(_make_delta(load_text(conn, base_hash), text),
+                                             ensure_ascii=False).encode('utf-8'))
+            if len(delta) < len(full):
+                data, depth = delta, row[0] + 1
+    conn.execute('INSERT INTO revision_blobs (hash, base_hash, depth, size, data) VALUES (?, ?, ?, ?, ?)',
+                 (blob_hash, base_hash if depth else None, depth, len(text.encode('utf-8')), data))
+    _cache_text(blob_hash, text)
+    return blob_hash
+
+
+# ---------- 版本 ----------
+def latest_revision(conn, article_id):
+    return conn.execute('''
+        SELECT id, blob_hash FROM article_revisions WHERE article_id = ? ORDER BY id DESC LIMIT 1
+    ''', (article_id,)).fetchone()
+
+
+def record_revision(conn, article_id, text, title, author_id, author_name, created_at):
+    """在调用方的事务里记录一个版本（不提交）；正文与最新版本相同时不重复记录，返回版本 ID"""
+    latest = latest_revision(conn, article_id)
+    base_hash = latest[1] if latest else None
+    blob_hash = store_blob(conn, text, base_hash)
+    if latest and blob_hash == base_hash:
+        return latest[0]
+    cursor = conn.execute('''
+        INSERT INTO article_revisions (article_id, blob_hash, title, author_id, author_name, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (article_id, blob_hash, title, author_id, author_name, created_at))
+    return cursor.lastrowid
+
+
+def delete_revisions(conn, article_id):
+    """在调用方的事务里删除文章的全部版本（不提交），以及因此不再被引用的 blob。
+    blob 按内容共享，还被其他文章的版本引用或作为其他 blob 差分基准的保留。返回删除的 blob 数"""
+    pending = [row[0] for row in conn.execute(
+        'SELECT DISTINCT blob_hash FROM article_revisions WHERE article_id = ?', (article_id,))]
+    conn.execute('DELETE FROM article_revisions WHERE article_id = ?', (article_id,))
+    removed = 0
+    while pending:
+        blob_hash = pending.pop()
+        if conn.execute('SELECT 1 FROM article_revisions WHERE blob_hash = ? LIMIT 1', (blob_hash,)).fetchone() \
+                or conn.execute('SELECT 1 FROM revision_blobs WHERE base_hash = ? LIMIT 1', (blob_hash,)).fetchone():
+            continue
+        row = conn.execute('SELECT base_hash FROM revision_blobs WHERE hash = ?', (blob_hash,)).fetchone()
+        if row is None:
+            continue
+        conn.execute('DELETE FROM revision_blobs WHERE hash = ?', (blob_hash,))
+        removed += 1
+        # 差分基准少了一个引用，可能也不再需要
+        if row[0] is not None:
+            pending.append(row[0])
+    return removed
+
+
+def list_revisions(conn, article_id):
+    rows = conn.execute('''
+        SELECT r.id, r.blob_hash, r.title, r.author_id, r.author_name, r.created_at, b.size
+        FROM article_revisions r
+        JOIN revision_blobs b ON b.hash = r.blob_hash
+        WHERE r.article_id = ?
+        ORDER BY r.id DESC
+    ''', (article_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_revision(conn, article_id, revision_id):
+    """返回版本信息和正文，不存在返回 None"""
+    row = conn.execute('''
+        SELECT id, blob_hash, title, author_id, author_name, created_at
+        FROM article_revisions WHERE id = ? AND article_id = ?
+    ''', (revision_id, article_id)).fetchone()
+    if row is None:
+        return None
+    revision = dict(row)
+    revision['content'] = load_text(conn, row['blob_hash'])
+    return revision
+
+
+def diff_revisions(conn, article_id, from_id, to_id, context=3):
+    """两个版本之间的 unified diff，任一版本不存在返回 None"""
+    old = get_revision(conn, article_id, from_id)
+    new = get_revision(conn, article_id, to_id)
+    if old is None or new is None:
+        return None
+    return unified_diff(old['content'], new['content'], f'revision-{from_id}', f'revision-{to_id}', context)
+
+
+def _lines(text):
+    # 只按 \n 切分（splitlines 还会在 \r、\u2028 等字符处切开），最后一行可能没有换行
+    parts = text.split('\n')
+    lines = [part + '\n' for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def unified_diff(old_text, new_text, fromfile, tofile, context=3):
+    """和 diff -u 相同的格式：末尾没有换行的最后一行单独换行，并在后面加上 "\\ No newline at end of file" 标记"""
+    lines = []
+    for line in difflib.unified_diff(_lines(old_text), _lines(new_text), fromfile=fromfile, tofile=tofile,
+                                     n=context):
+        lines.append(line)
+        if not line.endswith('\n'):
+            lines.append('\n\\ No newline at end of file\n')
+    return ''.join(lines)
+
+
+def storage_stats(conn):
+    row = conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0),
+               COALESCE(SUM(base_hash IS NOT NULL), 0)
+        FROM revision_blobs
+    ''').fetchone()
+    revisions = conn.execute('SELECT COUNT(*) FROM article_revisions').fetchone()[0]
+    return {'revisions': revisions, 'blobs': row[0], 'text_bytes': row[1], 'stored_bytes': row[2], 'deltas': row[3]}
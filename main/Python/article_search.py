@@ -0,0 +1,123 @@
+# article_search.py
+"""文章全文检索：FTS5 虚拟表 articles_fts，rowid 即文章 ID。
+
+正文由 article_storage 保存（可能在文件里），数据库触发器拿不到，所以由文章的
+创建/更新/删除接口在同一个事务里调用 index_article / remove_article 维护索引；
+已有文章用 python manage.py rebuild-search 重建。
+
+使用 trigram 分词，中文不需要额外分词器，任意 3 个字符以上的子串都能走索引。
+不足 3 个字符的搜索词 trigram 无法匹配，退化为在 articles 表上对文章 ID、标题和作者做 LIKE 扫描，
+不搜索正文：对每篇文章的正文做 LIKE 代价随站点内容线性增长。
+"""
+import html
+
+# 检索列：ref 是文章 ID 的字符串形式，用于兼容原来按 ID 搜索
+FTS_COLUMNS = ('ref', 'title', 'author_name', 'body')
+# 短搜索词的 LIKE 扫描只查这些 articles 表的列，不读正文
+SHORT_TERM_COLUMNS = ('CAST(a.id AS TEXT)', 'a.title', 'a.author_name')
+# bm25 列权重：标题命中最重要，其次作者，ID 与正文同权
+BM25_WEIGHTS = (1.0, 10.0, 5.0, 1.0)
+# 高亮标记先用私用区字符占位，转义正文后再替换成 <mark>，避免正文里的 HTML 被注入
+_MARK_OPEN, _MARK_CLOSE = '\ue000', '\ue001'
+SNIPPET_TOKENS = 24
+SNIPPET_CHARS = 40
+
+
+def create_table(conn):
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            {', '.join(FTS_COLUMNS)},
+            tokenize = 'trigram'
+        )
+    ''')
+
+
+def index_article(conn, article_id, title, author_name, body):
+    """写入或覆盖一篇文章的索引（不提交，由调用方控制事务）"""
+    conn.execute('DELETE FROM articles_fts WHERE rowid = ?', (article_id,))
+    conn.execute('''
+        INSERT INTO articles_fts (rowid, ref, title, author_name, body) VALUES (?, ?, ?, ?, ?)
+    ''', (article_id, str(article_id), title or '', author_name or '', body or ''))
+
+
+def update_title(conn, article_id, title):
+    conn.execute('UPDATE articles_fts SET title = ? WHERE rowid = ?', (title or '', article_id))
+
+
+def remove_article(conn, article_id):
+    conn.execute('DELETE FROM articles_fts WHERE rowid = ?', (article_id,))
+
+
+def rebuild(conn, storage):
+    """根据 articles 表和存储后端里的 Markdown 正文全量重建索引（不提交），返回索引的文章数"""
+    conn.execute('DELETE FROM articles_fts')
+    rows = conn.execute('SELECT id, title, author_name FROM articles').fetchall()
+    for row in rows:
+        body = storage.read(conn, row[0], 'md')
+        index_article(conn, row[0], row[1], row[2], body.text if body else '')
+    # 合并 b-tree 段，重建后查询更快
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+    return len(rows)
+
+
+def _highlight(snippet):
+    return html.escape(snippet or '').replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def _like_snippet(term, texts):
+    """LIKE 模式下 FTS5 的 snippet() 不可用，在命中的第一个字段里截取命中位置附近的文本"""
+    lowered = term.lower()
+    for text in texts:
+        pos = (text or '').lower().find(lowered)
+        if pos < 0:
+            continue
+        start, end = max(0, pos - SNIPPET_CHARS), pos + len(term) + SNIPPET_CHARS
+        return ('…' if start > 0 else '') + text[start:pos] + _MARK_OPEN + text[pos:pos + len(term)] \
+            + _MARK_CLOSE + text[pos + len(term):end] + ('…' if end < len(text) else '')
+    return ''
+
+
+def search(conn, term, status=None, limit=10, offset=0):
+    """检索文章，返回 (文章行列表, 总数)；每行带 HTML 转义后的高亮摘要 snippet。
+    3 个字符以上按 BM25 相关度排序；更短的搜索词只匹配 ID、标题和作者，按创建时间倒序"""
+    if len(term) >= 3:
+        # 整体作为一个短语，双引号转义后不会被当成 FTS 查询语法
+        source = 'articles_fts JOIN articles a ON a.id = articles_fts.rowid'
+        where = 'articles_fts MATCH ?'
+        params = ['"' + term.replace('"', '""') + '"']
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        snippet = f"snippet(articles_fts, -1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS})"
+        order = f'bm25(articles_fts, {weights}), a.created_at DESC'
+    else:
+        like = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        source = 'articles a'
+        where = '(' + ' OR '.join(f"{col} LIKE ? ESCAPE '\\'" for col in SHORT_TERM_COLUMNS) + ')'
+        params = [like] * len(SHORT_TERM_COLUMNS)
+        snippet = 'NULL'
+        order = 'a.created_at DESC'
+    if status:
+        where += ' AND a.status = ?'
+        params.append(status)
+
+    rows = conn.execute(f'''
+        SELECT a.id, a.title, a.author_id, a.author_name, a.status, a.created_at, a.updated_at,
+               a.word_count, a.reading_minutes, a.excerpt, a.views, {snippet} AS snippet
+        FROM {source}
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+    ''', params + [limit, offset]).fetchall()
+
+    total = conn.execute(f'''
+        SELECT COUNT(*) FROM {source}
+        WHERE {where}
+    ''', params).fetchone()[0]
+
+    results = []
+    for row in rows:
+        item = dict(row)
+        if item['snippet'] is None:
+            item['snippet'] = _like_snippet(term, (item['title'], item['author_name']))
+        item['snippet'] = _highlight(item['snippet'])
+        results.append(item)
+    return results, total
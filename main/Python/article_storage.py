@@ -0,0 +1,164 @@
+# article_storage.py
+"""文章正文存储后端。kind 为 'md'（Markdown 原文）或 'html'（渲染后的页面）。
+
+- FilesystemStorage：现有布局，static/articles/md/<id>.md 和 static/articles/html/<id>.html，
+  HTML 文件可以直接当静态页面访问；
+- SQLiteBlobStorage：zlib 压缩后存进站点数据库的 article_bodies 表，
+  与 articles 行在同一个事务里写入，没有零散小文件。
+
+所有方法都接收调用方的数据库连接；SQLite 后端只写不提交，由调用方控制事务。
+通过 config.ARTICLE_STORAGE 选择，python manage.py migrate-storage 在两种后端之间迁移。
+"""
+import os
+import time
+import zlib
+import logging
+import tempfile
+
+KINDS = ('md', 'html')
+
+
+class StoredBody:
+    __slots__ = ('text', 'mtime')
+
+    def __init__(self, text, mtime):
+        self.text = text
+        self.mtime = mtime
+
+
+def write_file_atomic(path, text):
+    """先写同目录下的临时文件再替换，读者不会读到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class FilesystemStorage:
+    name = 'filesystem'
+    # 超过这个时间的临时文件视为上次中断留下的，清理时删除
+    STALE_TMP_SECONDS = 3600
+
+    def __init__(self, md_dir, html_dir):
+        self.dirs = {'md': md_dir, 'html': html_dir}
+
+    def path(self, article_id, kind):
+        return os.path.join(self.dirs[kind], f'{article_id}.{kind}')
+
+    def public_path(self, article_id, kind):
+        return f'/articles/{kind}/{article_id}.{kind}'
+
+    def read(self, conn, article_id, kind):
+        path = self.path(article_id, kind)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                return StoredBody(f.read(), mtime)
+        except FileNotFoundError:
+            return None
+
+    def write(self, conn, article_id, kind, text):
+        write_file_atomic(self.path(article_id, kind), text)
+
+    def delete(self, conn, article_id):
+        for kind in KINDS:
+            try:
+                os.remove(self.path(article_id, kind))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"删除文章文件失败: {str(e)}")
+
+    def list_ids(self, conn, kind):
+        suffix = f'.{kind}'
+        return {int(name[:-len(suffix)]) for name in os.listdir(self.dirs[kind])
+                if name.endswith(suffix) and name[:-len(suffix)].isdigit()}
+
+    def delete_orphans(self, conn, article_ids, kinds=('html',)):
+        """删除不在 article_ids 中的文章正文和过期临时文件，返回删除的个数"""
+        removed = 0
+        now = time.time()
+        for kind in kinds:
+            for orphan in self.list_ids(conn, kind) - article_ids:
+                os.remove(self.path(orphan, kind))
+                removed += 1
+            for entry in os.scandir(self.dirs[kind]):
+                if entry.name.endswith('.tmp') and now - entry.stat().st_mtime >= self.STALE_TMP_SECONDS:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+
+class SQLiteBlobStorage:
+    name = 'sqlite'
+
+    @staticmethod
+    def create_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS article_bodies (
+                article_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (article_id, kind)
+            ) WITHOUT ROWID
+        ''')
+
+    def public_path(self, article_id, kind):
+        # 没有静态文件，通过接口访问
+        return f'/api/articles/{article_id}/view' if kind == 'html' else f'/api/articles/{article_id}/raw-md'
+
+    def read(self, conn, article_id, kind):
+        row = conn.execute('SELECT data, mtime FROM article_bodies WHERE article_id = ? AND kind = ?',
+                           (article_id, kind)).fetchone()
+        if row is None:
+            return None
+        return StoredBody(zlib.decompress(row[0]).decode('utf-8'), row[1])
+
+    def write(self, conn, article_id, kind, text):
+        data = text.encode('utf-8')
+        conn.execute('''
+            INSERT OR REPLACE INTO article_bodies (article_id, kind, size, mtime, data) VALUES (?, ?, ?, ?, ?)
+        ''', (article_id, kind, len(data), time.time(), zlib.compress(data)))
+
+    def delete(self, conn, article_id):
+        conn.execute('DELETE FROM article_bodies WHERE article_id = ?', (article_id,))
+
+    def list_ids(self, conn, kind):
+        return {row[0] for row in conn.execute('SELECT article_id FROM article_bodies WHERE kind = ?', (kind,))}
+
+    def delete_orphans(self, conn, article_ids, kinds=('html',)):
+        removed = 0
+        for kind in kinds:
+            orphans = self.list_ids(conn, kind) - article_ids
+            conn.executemany('DELETE FROM article_bodies WHERE article_id = ? AND kind = ?',
+                             [(orphan, kind) for orphan in orphans])
+            removed += len(orphans)
+        return removed
+
+
+def create_storage(name, md_dir, html_dir):
+    if name == FilesystemStorage.name:
+        return FilesystemStorage(md_dir, html_dir)
+    if name == SQLiteBlobStorage.name:
+        return SQLiteBlobStorage()
+    raise ValueError(f'未知的文章存储后端: {name}')
+
+
+def copy_all(conn, source, target, article_ids):
+    """把 article_ids 的全部正文从 source 复制到 target（不提交），返回 (复制数, 缺失数)"""
+    copied = missing = 0
+    for article_id in article_ids:
+        for kind in KINDS:
+            body = source.read(conn, article_id, kind)
+            if body is None:
+                missing += 1
+                continue
+            target.write(conn, article_id, kind, body.text)
+            copied += 1
+    return copied, missing
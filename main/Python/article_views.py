@@ -0,0 +1,107 @@
+# article_views.py
+import atexit
+import logging
+import threading
+from database_utils import db_connection
+
+FLUSH_SQL = 'UPDATE articles SET views = views + ? WHERE id = ?'
+
+
+class ViewCounter:
+    """文章阅读量缓冲计数。
+
+    view_article 只在内存里累加，按文章 ID 分到多个分片，每个分片一把锁，
+    并发的阅读请求很少争同一把锁，也完全不碰数据库写锁。
+    后台线程每隔 flush_interval 秒把各分片的增量换出来，用一次 executemany
+    + 一次提交写入 articles.views；写入失败时增量放回分片，下次再写。
+    进程退出时通过 atexit 写完剩余增量。
+    """
+
+    def __init__(self, shards=16, flush_interval=5.0):
+        self.flush_interval = flush_interval
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            # 第一次计数时才启动线程，多进程部署时每个 worker 各自启动
+            self._thread = threading.Thread(target=self._run, name='article-view-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _shard(self, article_id):
+        return self._shards[article_id % len(self._shards)]
+
+    def increment(self, article_id, count=1):
+        self.start()
+        counts, lock = self._shard(article_id)
+        with lock:
+            counts[article_id] = counts.get(article_id, 0) + count
+
+    def pending(self, article_id):
+        """尚未写入数据库的增量，接口返回时加到库里的 views 上"""
+        counts, lock = self._shard(article_id)
+        with lock:
+            return counts.get(article_id, 0)
+
+    def _take(self):
+        deltas = []
+        for counts, lock in self._shards:
+            with lock:
+                taken = list(counts.items())
+                counts.clear()
+            deltas.extend((delta, article_id) for article_id, delta in taken)
+        return deltas
+
+    def flush(self):
+        """在调用线程里同步写入当前累积的增量，返回写入的文章数"""
+        deltas = self._take()
+        if not deltas:
+            return 0
+        try:
+            with db_connection() as conn:
+                conn.executemany(FLUSH_SQL, deltas)
+                conn.commit()
+        except Exception as e:
+            for delta, article_id in deltas:
+                self.increment(article_id, delta)
+            with self._lock:
+                self.failed += 1
+            logging.error(f'Error flushing views of {len(deltas)} articles: {str(e)}')
+            return 0
+        with self._lock:
+            self.flushed += len(deltas)
+            self.batches += 1
+        return len(deltas)
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        pending = 0
+        for counts, lock in self._shards:
+            with lock:
+                pending += sum(counts.values())
+        with self._lock:
+            return {
+                'pending': pending,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'batches': self.batches
+            }
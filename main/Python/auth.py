@@ -0,0 +1,103 @@
+# auth.py
+"""JWT 签发/校验与 require_auth 装饰器"""
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+import jwt
+from flask import request, jsonify, g
+import config
+
+
+class ClaimsCache:
+    """已验证 token 的声明缓存（LRU）。
+
+    键是 token 的 SHA-256 摘要（不在内存里保存原始 token），
+    条目在 token 自身的 exp 时刻失效，之后会重新走 jwt.decode 并得到过期错误。
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key, claims):
+        expires_at = claims.get('exp')
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+claims_cache = ClaimsCache(config.AUTH_CACHE_SIZE)
+
+
+def encode_token(payload):
+    return jwt.encode(payload, config.SECRET_KEY, algorithm=config.JWT_ALGORITHM)
+
+
+def decode_token(token):
+    """校验 token 并返回声明；同一个 token 在过期前只做一次 HMAC 校验和 JSON 解析"""
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    claims = claims_cache.get(key)
+    if claims is None:
+        claims = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        claims_cache.put(key, claims)
+    # 返回副本，避免调用方修改缓存中的声明
+    return dict(claims)
+
+
+def bearer_token(allow_query=False):
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        # EventSource 不能设置请求头，只能把 token 放在查询参数里
+        return request.args.get('token') if allow_query else None
+    return auth_header.split(' ', 1)[1]
+
+
+def require_auth(min_level=None, allow_query_token=False):
+    """要求请求携带有效的 Bearer token，声明保存在 g.current_user；
+    min_level 不为空时还要求用户等级不低于该值；allow_query_token 时也接受 ?token="""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token = bearer_token(allow_query_token)
+            if not token:
+                return jsonify({"error": "Unauthorized"}), 401
+            try:
+                payload = decode_token(token)
+            except jwt.ExpiredSignatureError:
+                return jsonify({"error": "Token已过期"}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({"error": "无效的Token"}), 401
+
+            if min_level is not None and (payload.get('level') or 0) < min_level:
+                return jsonify({"error": "权限不足"}), 403
+
+            g.current_user = payload
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
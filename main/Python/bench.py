@@ -0,0 +1,154 @@
+# bench.py
+"""性能基准，由 manage.py 的 bench-* 子命令调用，输出每次操作的平均耗时"""
+import os
+import time
+import random
+import shutil
+import tempfile
+
+
+def _timeit(func, iterations):
+    """执行 iterations 次，返回单次平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _report(title, results):
+    print(title)
+    baseline = results[0][1]
+    for name, cost in results:
+        print(f'  {name:<28} {cost:>10.1f} us/次   {baseline / cost:>6.1f}x')
+
+
+# ---------- 文章模板渲染 ----------
+def bench_render(iterations=500):
+    """对比每次从源码构建 Template 与使用编译缓存的 Environment"""
+    from jinja2 import Template
+    import article
+
+    template_name = 'articles.html'
+    # 与 article.render_page 传给模板的参数相同，content 是 Markdown 渲染出的 HTML 片段
+    context = {
+        'title': '基准测试文章',
+        'author_name': 'admin',
+        'created_at': '2025-01-01T00:00:00',
+        'content': '<p>' + '正文内容 ' * 500 + '</p>'
+    }
+
+    def from_source():
+        # 旧实现：每次读取文件并编译
+        with open(os.path.join(article.TEMPLATES_DIR, template_name), 'r', encoding='utf-8') as f:
+            Template(f.read()).render(**context)
+
+    def compiled():
+        article.render_jinja_template(template_name, **context)
+
+    # 预热：填充字节码缓存和 Environment 的模板缓存
+    compiled()
+    _report(f'模板渲染 {template_name}（{iterations} 次）', [
+        ('每次从源码编译', _timeit(from_source, iterations)),
+        ('编译缓存 Environment', _timeit(compiled, iterations)),
+    ])
+
+
+# ---------- Markdown 增量渲染 ----------
+MARKDOWN_PIECES = (
+    '## 小节 {0}\n',
+    '第 {0} 段正文，包含 *强调*、**加粗**、`行内代码` 和 [链接](https://example.com/{0})。\n'
+    '同一段落的第二行，继续写一些内容。\n',
+    '- 列表项 {0}\n- 第二项\n  - 嵌套项\n',
+    '1. 步骤 {0}\n2. 下一步\n',
+    '> 引用 {0}\n> 第二行\n',
+    '    缩进代码 {0}\n    print("hello")\n',
+    '```\n围栏代码 {0}\n\n空行之后\n```\n',
+    '| 列一 | 列二 |\n|------|------|\n| {0} | 值 |\n',
+    '---\n',
+)
+
+
+def sample_markdown(blocks, seed=0):
+    """生成包含常见块类型的随机文档"""
+    rng = random.Random(seed)
+    return '\n'.join(rng.choice(MARKDOWN_PIECES).format(i) + rng.choice(('', '\n', '\n\n'))
+                     for i in range(blocks))
+
+
+def bench_markdown(size_kb=50, iterations=50):
+    """先校验增量渲染与整篇渲染结果一致，再对比修改一个字后重新渲染的耗时"""
+    import config
+    from md_blocks import BlockRenderer
+    from database_utils import db_connection
+    import article
+
+    renderer = BlockRenderer(config.MARKDOWN_EXTENSIONS, max_blocks=100000)
+
+    # 正确性：随机文档 + 已有文章
+    texts = [sample_markdown(random.Random(seed).randint(1, 40), seed) for seed in range(2000)]
+    with db_connection() as conn:
+        for (article_id,) in conn.execute('SELECT id FROM articles').fetchall():
+            body = article.storage.read(conn, article_id, 'md')
+            if body is not None:
+                texts.append(body.text)
+    bad = renderer.mismatches(texts)
+    print(f'正确性校验：{len(texts)} 篇文档，不一致 {len(bad)} 篇')
+    if bad:
+        raise SystemExit(1)
+
+    # 性能：约 size_kb 大小的文档，每次修改中间一个块里的一个字
+    blocks = 1
+    while len(sample_markdown(blocks, seed=1).encode('utf-8')) < size_kb * 1024:
+        blocks += 16
+    document = sample_markdown(blocks, seed=1)
+    edits = []
+    for i in range(iterations):
+        pos = document.index('正文', len(document) * i // iterations)
+        edits.append(document[:pos] + f'修订{i}' + document[pos + 2:])
+    renderer.render(document)
+
+    full_edits = iter(edits)
+    incremental_edits = iter(edits)
+    _report(f'Markdown 渲染 {len(document.encode("utf-8")) // 1024} KB 文档，每次修改一处（{iterations} 次）', [
+        ('整篇渲染', _timeit(lambda: renderer.render_full(next(full_edits)), iterations)),
+        ('按块增量渲染', _timeit(lambda: renderer.render(next(incremental_edits)), iterations)),
+    ])
+
+
+# ---------- 文章正文存储 ----------
+def bench_storage(articles=500, iterations=5000):
+    """在临时目录里分别用两种后端写入同样的文章，对比随机读取正文的耗时"""
+    from database_utils import ConnectionPool
+    from article_storage import FilesystemStorage, SQLiteBlobStorage
+
+    workdir = tempfile.mkdtemp(prefix='class-site-bench-')
+    try:
+        md_dir = os.path.join(workdir, 'md')
+        html_dir = os.path.join(workdir, 'html')
+        os.makedirs(md_dir)
+        os.makedirs(html_dir)
+        pool = ConnectionPool(os.path.join(workdir, 'bench.db'), max_idle=1)
+        backends = [FilesystemStorage(md_dir, html_dir), SQLiteBlobStorage()]
+        rng = random.Random(0)
+        with pool.connection() as conn:
+            SQLiteBlobStorage.create_table(conn)
+            total_bytes = 0
+            for article_id in range(1, articles + 1):
+                text = sample_markdown(rng.randint(5, 60), seed=article_id)
+                total_bytes += len(text.encode('utf-8'))
+                for backend in backends:
+                    backend.write(conn, article_id, 'md', text)
+            conn.commit()
+
+            order = [rng.randint(1, articles) for _ in range(iterations)]
+            results = []
+            for backend in backends:
+                reads = iter(order)
+                results.append((backend.name, _timeit(lambda: backend.read(conn, next(reads), 'md'), iterations)))
+            stored = conn.execute('SELECT COALESCE(SUM(length(data)), 0) FROM article_bodies').fetchone()[0]
+        pool.close_all()
+
+        _report(f'随机读取文章正文：{articles} 篇共 {total_bytes // 1024} KB（{iterations} 次）', results)
+        print(f'  SQLite 压缩后 {stored // 1024} KB，占原文 {stored / total_bytes:.0%}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,55 @@
+# config.py
+"""站点配置：统一从环境变量读取，未设置时使用开发环境默认值"""
+import os
+
+# JWT 签名密钥，所有签发/校验 token 的地方都必须使用这里的值
+SECRET_KEY = os.environ.get('CLASS_SITE_SECRET_KEY', 'dev_secret_key_here')
+JWT_ALGORITHM = 'HS256'
+
+# 已验证 token 声明缓存的最大条目数
+AUTH_CACHE_SIZE = int(os.environ.get('CLASS_SITE_AUTH_CACHE_SIZE', 1024))
+
+# 文章正文内存缓存容量（字节）
+ARTICLE_CACHE_MAX_BYTES = int(os.environ.get('CLASS_SITE_ARTICLE_CACHE_BYTES', 32 * 1024 * 1024))
+
+# 文章后台渲染线程数
+RENDER_WORKERS = int(os.environ.get('CLASS_SITE_RENDER_WORKERS', 2))
+# 增量保存（PATCH）后等待多少秒没有新的保存才渲染
+RENDER_DEBOUNCE_SECONDS = float(os.environ.get('CLASS_SITE_RENDER_DEBOUNCE', 2.0))
+
+# Markdown 在独立进程里渲染：单次渲染超时（秒）、正文和渲染结果的大小上限（字节）、
+# 渲染进程内存上限（MB，0 为不限制，Windows 上不生效）
+RENDER_TIMEOUT_SECONDS = float(os.environ.get('CLASS_SITE_RENDER_TIMEOUT', 10.0))
+RENDER_MAX_INPUT_BYTES = int(os.environ.get('CLASS_SITE_RENDER_MAX_INPUT_BYTES', 2 * 1024 * 1024))
+RENDER_MAX_OUTPUT_BYTES = int(os.environ.get('CLASS_SITE_RENDER_MAX_OUTPUT_BYTES', 8 * 1024 * 1024))
+RENDER_MEMORY_MB = int(os.environ.get('CLASS_SITE_RENDER_MEMORY_MB', 1024))
+
+# 文章阅读量在内存里累积多少秒写一次数据库
+VIEW_FLUSH_SECONDS = float(os.environ.get('CLASS_SITE_VIEW_FLUSH', 5.0))
+
+# 在线状态：心跳间隔应小于 PRESENCE_TTL_SECONDS，超过这么多秒没有心跳算作离线
+PRESENCE_TTL_SECONDS = float(os.environ.get('CLASS_SITE_PRESENCE_TTL', 90.0))
+PRESENCE_SWEEP_SECONDS = float(os.environ.get('CLASS_SITE_PRESENCE_SWEEP', 30.0))
+
+# 管理后台实时推送：生产者查询间隔、保活心跳间隔（秒），每个连接最多缓冲的事件数
+ADMIN_EVENTS_POLL_SECONDS = float(os.environ.get('CLASS_SITE_ADMIN_EVENTS_POLL', 5.0))
+ADMIN_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('CLASS_SITE_ADMIN_EVENTS_HEARTBEAT', 15.0))
+ADMIN_EVENTS_CLIENT_BUFFER = int(os.environ.get('CLASS_SITE_ADMIN_EVENTS_BUFFER', 64))
+
+# 站点统计计数在内存里维护，每隔这么多秒和数据库对账一次
+SITE_STATS_RECONCILE_SECONDS = float(os.environ.get('CLASS_SITE_STATS_RECONCILE', 300.0))
+
+# 单个上传文件的大小上限（字节）
+UPLOAD_MAX_BYTES = int(os.environ.get('CLASS_SITE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+
+# 文章正文存储后端：filesystem（static/articles 下的文件）或 sqlite（压缩后存进站点数据库）。
+# sqlite 后端没有静态 HTML 文件，文章页面通过 /api/articles/<id>/view 访问
+ARTICLE_STORAGE = os.environ.get('CLASS_SITE_ARTICLE_STORAGE', 'filesystem')
+
+# 已发布文章的静态导出目录；CLASS_SITE_EXPORT_ON_PUBLISH=0 时只在 manage.py export-static 时导出
+STATIC_EXPORT_DIR = os.environ.get('CLASS_SITE_EXPORT_DIR',
+                                   os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'export'))
+STATIC_EXPORT_ON_PUBLISH = os.environ.get('CLASS_SITE_EXPORT_ON_PUBLISH', '1') == '1'
+
+# Markdown 扩展，逗号分隔，例如 tables,fenced_code；修改后用 manage.py rerender 重新生成 HTML
+MARKDOWN_EXTENSIONS = [name for name in os.environ.get('CLASS_SITE_MARKDOWN_EXTENSIONS', '').split(',') if name]
@@ -1,111 +1,151 @@
 # database_utils.py
 import sqlite3
 import os
+import queue
 import datetime
+from contextlib import contextmanager
+from flask import g, has_app_context
 
 DB_DIR = os.path.join(os.path.dirname(__file__), 'database')
 os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, 'class_site.db')
 
+# ---------- 连接管理 ----------
+# 每个新连接执行一次的 PRAGMA
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),        # 读写互不阻塞
+    ('synchronous', 'NORMAL'),      # WAL 模式下足够安全，提交时不再每次 fsync
+    ('busy_timeout', 5000),         # 遇到写锁时等待而不是立即报 database is locked
+    ('cache_size', -16000),         # 约16MB页缓存
+    ('mmap_size', 268435456),       # 256MB 内存映射读
+    ('temp_store', 'MEMORY'),
+)
+
+
+class ConnectionPool:
+    """SQLite 连接池：连接长期复用，PRAGMA 只设置一次，预编译语句缓存随连接保留"""
+
+    def __init__(self, db_path, max_idle=8, cached_statements=256):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for name, value in SQLITE_PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        # 归还前回滚未提交的事务，避免把脏状态带给下一个使用者
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+def get_db():
+    """获取绑定到当前应用上下文的连接，上下文结束时自动归还连接池"""
+    if 'db_conn' not in g:
+        g.db_conn = pool.acquire()
+    return g.db_conn
+
+
+def release_db(exc=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
+
+
+@contextmanager
+def db_connection():
+    """请求内复用上下文连接；后台线程、命令行等无应用上下文时从连接池借用"""
+    if has_app_context():
+        yield get_db()
+    else:
+        with pool.connection() as conn:
+            yield conn
+
+
+@contextmanager
+def write_transaction():
+    """短写事务：BEGIN IMMEDIATE 一开始就拿到写锁，正常结束提交，异常回滚。
+    连接上已有事务时（同一请求里先做过写操作，或者嵌套调用）改用 SAVEPOINT：
+    异常只回滚这一段，提交或回滚整个事务留给最外层的所有者"""
+    with db_connection() as conn:
+        if conn.in_transaction:
+            conn.execute('SAVEPOINT write_transaction')
+            try:
+                yield conn
+            except Exception:
+                conn.execute('ROLLBACK TO write_transaction')
+                conn.execute('RELEASE write_transaction')
+                raise
+            conn.execute('RELEASE write_transaction')
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
 # ---------- 初始化 ----------
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    # 1. 用户表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE,
-            display_name TEXT,
-            password TEXT,
-            level INTEGER,
-            phone TEXT,
-            email TEXT,
-            is_banned INTEGER DEFAULT 0,
-            last_login TEXT,
-            created_at TEXT,
-            is_online INTEGER DEFAULT 0
-        )
-    ''')
-
-    # 2. 注册申请表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS registration_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            display_name TEXT,
-            password TEXT,
-            phone TEXT,
-            email TEXT,
-            created_at TEXT,
-            status TEXT DEFAULT 'pending',
-            reviewed_by TEXT,
-            reviewed_at TEXT
-        )
-    ''')
-
-    # 3. 系统设置表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS system_settings (
-            setting_name TEXT UNIQUE,
-            setting_value TEXT
-        )
-    ''')
-
-    # 4. 访问日志表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS access_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            username TEXT,
-            operator_user_id TEXT,
-            operator_username TEXT,
-            action TEXT,
-            ip_address TEXT,
-            browser TEXT,
-            device_type TEXT,
-            access_time TEXT,
-            location TEXT
-        )
-    ''')
-
-    # 5. 文章表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS articles (
-            id INTEGER PRIMARY KEY,
-            title TEXT,
-            content TEXT,
-            author_id TEXT,
-            author_name TEXT,
-            status TEXT DEFAULT 'draft',
-            created_at TEXT,
-            updated_at TEXT,
-            html_path TEXT,
-            md_path TEXT
-        )
-    ''')
-
-    # 默认系统设置：开放注册
-    c.execute('''INSERT OR IGNORE INTO system_settings (setting_name, setting_value)
-                 VALUES ('registration_status', 'open')''')
-
-    # 默认管理员
-    c.execute('''INSERT OR IGNORE INTO users
-                 (id, username, display_name, password, level, phone, email, created_at, is_online)
-                 VALUES ('1', 'admin', '管理员', '111111', 6, '12345678901', 'admin@example.com', ?, 0)''',
-              (datetime.datetime.now().isoformat(),))
-
-    conn.commit()
-    conn.close()
+    """建表/升级表结构统一交给 migrations，按 schema_version 只执行未执行过的迁移"""
+    from migrations import migrate
+    return migrate()
 
 # ---------- 分页 + 搜索建议者筛选 + 排序 ----------
-def load_user_data(filter_level=None, filter_status=None, search_query=None, sort_by='id', sort_order='asc', last_login_start=None, last_login_end=None, created_start=None, created_end=None, page=1, page_size=30):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def load_user_data(filter_level=None, filter_status=None, search_query=None, sort_by='id', sort_order='asc', last_login_start=None, last_login_end=None, created_start=None, created_end=None, page=1, page_size=30, online_ids=()):
+    """online_ids 为当前在线的用户 ID（来自 presence），online/offline 筛选按它过滤"""
+    with db_connection() as conn:
+        return _load_user_data(conn.cursor(), filter_level, filter_status, search_query, sort_by, sort_order,
+                               last_login_start, last_login_end, created_start, created_end, page, page_size,
+                               online_ids)
+
+
+def _load_user_data(cur, filter_level, filter_status, search_query, sort_by, sort_order, last_login_start,
+                    last_login_end, created_start, created_end, page, page_size, online_ids=()):
 
     sql = 'SELECT * FROM users WHERE 1=1'
     params = []
+    online_ids = [str(user_id) for user_id in online_ids]
+    # 在线状态只在内存里，拼成 id IN (...)，在线人数不多
+    online_in = '(' + ','.join('?' * len(online_ids)) + ')'
 
     # 等级筛选
     if filter_level is not None and str(filter_level).strip() != '':
@@ -115,9 +155,11 @@ def load_user_data(filter_level=None, filter_status=None, search_query=None, sor
     # 状态筛选
     if filter_status:
         if filter_status == 'online':
-            sql += ' AND is_online = 1'
+            sql += f' AND id IN {online_in}'
+            params.extend(online_ids)
         elif filter_status == 'offline':
-            sql += ' AND is_online = 0'
+            sql += f' AND id NOT IN {online_in}'
+            params.extend(online_ids)
         elif filter_status == 'banned':
             sql += ' AND is_banned = 1'
 
@@ -179,6 +221,9 @@ def load_user_data(filter_level=None, filter_status=None, search_query=None, sor
         cur.execute(sql, params)
         rows = cur.fetchall()
         users = [dict(zip([d[0] for d in cur.description], row)) for row in rows]
+        online = set(online_ids)
+        for user in users:
+            user['is_online'] = 1 if str(user['id']) in online else 0
     except Exception as e:
         print(f"SQL执行错误: {e}")
         print(f"SQL: {sql}")
@@ -195,9 +240,11 @@ def load_user_data(filter_level=None, filter_status=None, search_query=None, sor
 
     if filter_status:
         if filter_status == 'online':
-            count_sql += ' AND is_online = 1'
+            count_sql += f' AND id IN {online_in}'
+            count_params.extend(online_ids)
         elif filter_status == 'offline':
-            count_sql += ' AND is_online = 0'
+            count_sql += f' AND id NOT IN {online_in}'
+            count_params.extend(online_ids)
         elif filter_status == 'banned':
             count_sql += ' AND is_banned = 1'
 
@@ -245,39 +292,132 @@ def load_user_data(filter_level=None, filter_status=None, search_query=None, sor
         print(f"SQL计数错误: {e}")
         total = 0
 
-    conn.close()
     return {'users': users, 'total': total, 'page': page, 'page_size': page_size}
 
+# ---------- 用户点查 ----------
+class UserRepository:
+    """按主键/唯一索引查询单个用户，避免整表加载后在 Python 中线性查找"""
+
+    def _fetch_one(self, sql, params):
+        with db_connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    def get_by_id(self, user_id):
+        if user_id is None:
+            return None
+        # id 列为 TEXT 主键，统一按字符串比较才能命中主键索引
+        return self._fetch_one('SELECT * FROM users WHERE id = ?', (str(user_id),))
+
+    def get_by_username(self, username):
+        if not username:
+            return None
+        return self._fetch_one('SELECT * FROM users WHERE username = ?', (username,))
+
+    def get_by_login_id(self, login_id):
+        # 纯数字按ID登录，否则按用户名登录
+        if not login_id:
+            return None
+        login_id = str(login_id)
+        if login_id.isdigit():
+            return self.get_by_id(login_id)
+        return self.get_by_username(login_id)
+
+
+user_repo = UserRepository()
+
+# ---------- 用户单行写操作 ----------
+class StaleUserVersion(Exception):
+    """乐观锁冲突：用户记录在读取之后已被其他请求修改"""
+
+
+# 允许按列更新的字段（白名单，防止SQL注入）
+USER_MUTABLE_FIELDS = ('username', 'display_name', 'password', 'level', 'phone', 'email',
+                       'is_banned', 'last_login', 'is_online')
+
+
+def update_user_fields(user_id, expected_version=None, **changes):
+    """只更新指定列；传入 expected_version 时启用乐观锁，版本不符抛出 StaleUserVersion。
+    返回是否有行被更新"""
+    unknown = set(changes) - set(USER_MUTABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"不允许更新的字段: {', '.join(sorted(unknown))}")
+    if not changes:
+        return False
+
+    assignments = ', '.join(f'{field} = ?' for field in changes)
+    sql = f'UPDATE users SET {assignments}, version = version + 1 WHERE id = ?'
+    params = list(changes.values()) + [str(user_id)]
+    if expected_version is not None:
+        sql += ' AND version = ?'
+        params.append(expected_version)
+
+    # 事务只包含这一条语句，持锁时间最短
+    with write_transaction() as conn:
+        updated = conn.execute(sql, params).rowcount == 1
+        if not updated and expected_version is not None:
+            if conn.execute('SELECT 1 FROM users WHERE id = ?', (str(user_id),)).fetchone():
+                raise StaleUserVersion(user_id)
+    return updated
+
+
+def delete_user(user_id, expected_version=None):
+    """删除单个用户，返回是否删除成功"""
+    sql = 'DELETE FROM users WHERE id = ?'
+    params = [str(user_id)]
+    if expected_version is not None:
+        sql += ' AND version = ?'
+        params.append(expected_version)
+
+    with write_transaction() as conn:
+        deleted = conn.execute(sql, params).rowcount == 1
+        if not deleted and expected_version is not None:
+            if conn.execute('SELECT 1 FROM users WHERE id = ?', (str(user_id),)).fetchone():
+                raise StaleUserVersion(user_id)
+    return deleted
+
+
+def insert_user(username, display_name, password, level=1, phone='', email='',
+                is_banned=0, created_at=None):
+    """新增用户：在同一个写事务内分配 MAX(id)+1，避免并发注册拿到相同ID。
+    用户名重复时抛出 sqlite3.IntegrityError"""
+    with write_transaction() as conn:
+        return insert_user_in(conn, username, display_name, password, level, phone, email, is_banned, created_at)
+
+
+def insert_user_in(conn, username, display_name, password, level=1, phone='', email='',
+                   is_banned=0, created_at=None):
+    """在调用方已开始的写事务里新增用户（不提交），用于和其他写操作放在同一个事务"""
+    created_at = created_at or datetime.datetime.now().isoformat()
+    max_id = conn.execute('SELECT MAX(CAST(id AS INTEGER)) FROM users').fetchone()[0]
+    new_id = str(int(max_id or 0) + 1)
+    conn.execute('''
+        INSERT INTO users
+        (id, username, display_name, password, level, phone, email, is_banned, last_login, created_at, is_online, version)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+    ''', (new_id, username, display_name, password, level, phone, email,
+          int(bool(is_banned)), None, created_at, 0, 0))
+
+    return {
+        'id': new_id,
+        'username': username,
+        'display_name': display_name,
+        'password': password,
+        'level': level,
+        'phone': phone,
+        'email': email,
+        'is_banned': int(bool(is_banned)),
+        'last_login': None,
+        'created_at': created_at,
+        'is_online': 0,
+        'version': 0
+    }
 # ---------- 工具 ----------
-def save_user_data(users):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    # 先清空表
-    cur.execute('DELETE FROM users')
-
-    # 批量插入新数据
-    cur.executemany('''
-        INSERT INTO users 
-        VALUES (?,?,?,?,?,?,?,?,?,?,?)
-    ''', [(u['id'], u['username'], u['display_name'], u['password'], u['level'],
-           u['phone'], u['email'], u['is_banned'], u['last_login'],
-           u['created_at'], u['is_online']) for u in users])
-
-    conn.commit()
-    conn.close()
-
 def get_system_setting(key, default=None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('SELECT setting_value FROM system_settings WHERE setting_name = ?', (key,))
-    row = cur.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        row = conn.execute('SELECT setting_value FROM system_settings WHERE setting_name = ?', (key,)).fetchone()
     return row[0] if row else default
 
 def update_system_setting(key, value):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('INSERT OR REPLACE INTO system_settings (setting_name, setting_value) VALUES (?,?)', (key, value))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with write_transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO system_settings (setting_name, setting_value) VALUES (?,?)', (key, value))
\ No newline at end of file
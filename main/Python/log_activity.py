@@ -1,11 +1,139 @@
 # log_activity.py
-import os
-import sqlite3
+import atexit
 import datetime
 import logging
+import queue
+import threading
+import time
 from flask import request
+from database_utils import db_connection
+from visit_rollup import apply_rollups
+from site_stats import site_stats
+
+INSERT_ACCESS_LOG_SQL = '''
+    INSERT INTO access_logs (user_id, username, operator_user_id, operator_username, action, ip_address, browser, device_type, access_time, location)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class AccessLogWriter:
+    """访问日志异步批量写入。
+
+    请求线程只把记录放进有界队列就返回；后台线程攒够 batch_size 条
+    或等待满 flush_interval 秒后用一次 executemany + 一次提交写入，
+    同一事务里累加 visit_daily / visit_hourly 汇总计数。
+    队列满时丢弃新记录并计数，不阻塞请求。进程退出时通过 atexit 写完剩余记录。
+    """
+
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            # 第一次写日志时才启动线程，多进程部署时每个 worker 各自启动
+            self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def submit(self, record):
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            with site_stats.writing():
+                with db_connection() as conn:
+                    conn.executemany(INSERT_ACCESS_LOG_SQL, batch)
+                    apply_rollups(conn, batch)
+                    conn.commit()
+                site_stats.add_visits(record[8] for record in batch)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(batch)
+            logging.error(f'Error writing {len(batch)} access logs: {str(e)}')
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """在调用线程里同步写完队列中已有的记录"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'pending': self._queue.qsize(),
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches
+            }
+
+
+access_log_writer = AccessLogWriter()
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'class_site.db')
 
 def log_user_activity(action, user_id=None, username=None, operator_user_id=None, operator_username=None):
     try:
@@ -23,17 +151,10 @@ def log_user_activity(action, user_id=None, username=None, operator_user_id=None
         if not operator_username:
             operator_username = 'System'
 
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO access_logs (user_id, username, operator_user_id, operator_username, action, ip_address, browser, device_type, access_time, location)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, username, operator_user_id, operator_username, action, ip_address, browser, device_type, access_time, 'Unknown'))
-
-        conn.commit()
-        conn.close()
+        # 只入队，由后台线程批量写库
+        access_log_writer.submit((user_id, username, operator_user_id, operator_username, action,
+                                  ip_address, browser, device_type, access_time, 'Unknown'))
 
-        logging.basicConfig(filename='server.log', level=logging.INFO)
         logging.info(f'[{access_time}] - Operator: {operator_username}({operator_user_id}) - Target: {username}({user_id}) - {action} - Device: {device_type}')
     except Exception as e:
         logging.error(f'Error logging activity: {str(e)}')
@@ -0,0 +1,234 @@
+# manage.py
+"""命令行管理入口
+
+    python manage.py migrate            升级数据库结构到最新版本
+    python manage.py migrate --target 2 只升级到指定版本
+    python manage.py db-status          查看当前版本和待执行的迁移
+    python manage.py backfill-visits    根据 access_logs 重建访问量汇总表
+    python manage.py rebuild-search     根据 Markdown 正文重建文章全文索引
+    python manage.py rerender           多进程重新渲染全部文章 HTML（指纹未变的跳过）
+    python manage.py bench-render       文章模板渲染基准
+    python manage.py bench-markdown     Markdown 增量渲染正确性校验与基准
+    python manage.py migrate-storage --to sqlite   把文章正文迁移到另一种存储后端
+    python manage.py bench-storage      文章正文存储后端读取基准
+    python manage.py export-static      导出已发布文章的静态页面（只重写有变化的文件）
+"""
+import argparse
+import sys
+from database_utils import ConnectionPool, DB_PATH
+
+
+def _open_pool(args):
+    # --db 可以指定其他数据库文件（例如旧的 register.db），默认使用站点数据库
+    return ConnectionPool(args.db or DB_PATH, max_idle=1)
+
+
+# ---------- 数据库迁移 ----------
+def cmd_migrate(args):
+    from migrations import migrate, current_version
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        applied = migrate(conn, target=args.target)
+        for version, description in applied:
+            print(f'已执行迁移 {version:04d}: {description}')
+        if not applied:
+            print('数据库已是最新版本')
+        print(f'当前版本: {current_version(conn)}')
+    pool.close_all()
+
+
+def cmd_db_status(args):
+    from migrations import current_version, pending_migrations
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        print(f'当前版本: {current_version(conn)}')
+        pending = pending_migrations(conn)
+        for version, description, _ in pending:
+            print(f'待执行 {version:04d}: {description}')
+        if not pending:
+            print('没有待执行的迁移')
+    pool.close_all()
+
+
+# ---------- 访问量汇总 ----------
+def cmd_backfill_visits(args):
+    import visit_rollup
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        rows, total = visit_rollup.backfill(conn)
+    pool.close_all()
+    print(f'已重建访问量汇总：{rows} 行按天汇总，共 {total} 次访问')
+
+
+# ---------- 文章全文索引 ----------
+def cmd_rebuild_search(args):
+    import article_search
+    import article
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            count = article_search.rebuild(conn, article.storage)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    pool.close_all()
+    print(f'已重建全文索引：{count} 篇文章')
+
+
+# ---------- 批量重新渲染 ----------
+def cmd_rerender(args):
+    import article_bulk
+
+    def progress(done, total, rate):
+        print(f'  {done}/{total}  {rate:.0f} 篇/秒', flush=True)
+
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        result = article_bulk.rerender_all(conn, workers=args.workers, force=args.force, progress=progress)
+    pool.close_all()
+
+    for article_id, error in result['errors']:
+        print(f'  失败 {article_id}: {error}')
+    print(f"共 {result['total']} 篇：渲染 {result['rendered']}，跳过 {result['skipped']}，失败 {result['failed']}；"
+          f"用时 {result['seconds']:.1f} 秒，{result['per_second']:.0f} 篇/秒")
+    print(f"已删除 {result['orphans_removed']} 个无对应文章的 HTML/临时文件")
+    if result['orphan_md']:
+        print(f"有 {len(result['orphan_md'])} 篇 Markdown 正文没有对应文章（未删除）")
+    if result['rendered']:
+        # 正文缓存在各个站点进程的内存里，命令行进程无法让它失效
+        print('运行中的站点进程需要重启才能返回新的 HTML')
+
+
+# ---------- 文章正文存储 ----------
+def cmd_migrate_storage(args):
+    import config
+    from article import MD_ARTICLES_DIR, HTML_ARTICLES_DIR
+    from article_storage import create_storage, copy_all, FilesystemStorage, SQLiteBlobStorage
+
+    target = create_storage(args.to, MD_ARTICLES_DIR, HTML_ARTICLES_DIR)
+    source_name = SQLiteBlobStorage.name if args.to == FilesystemStorage.name else FilesystemStorage.name
+    source = create_storage(source_name, MD_ARTICLES_DIR, HTML_ARTICLES_DIR)
+
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ids = [row[0] for row in conn.execute('SELECT id FROM articles')]
+            copied, missing = copy_all(conn, source, target, ids)
+            conn.executemany('UPDATE articles SET md_path = ?, html_path = ? WHERE id = ?',
+                             [(target.public_path(i, 'md'), target.public_path(i, 'html'), i) for i in ids])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        # 目标写入成功提交后再删除源数据
+        if args.delete_source:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for article_id in ids:
+                    source.delete(conn, article_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    pool.close_all()
+
+    print(f'{source.name} -> {target.name}：{len(ids)} 篇文章，复制 {copied} 份正文，缺失 {missing} 份')
+    if args.delete_source:
+        print(f'已删除 {source.name} 中的正文')
+    if config.ARTICLE_STORAGE != target.name:
+        print(f'请设置 CLASS_SITE_ARTICLE_STORAGE={target.name} 后重启站点')
+
+
+# ---------- 静态导出 ----------
+def cmd_export_static(args):
+    import article
+    from static_export import StaticExporter
+    exporter = article.static_exporter
+    if args.out:
+        exporter = StaticExporter(args.out, article.storage, article.render_jinja_template)
+    pool = _open_pool(args)
+    with pool.connection() as conn:
+        stats = exporter.export_all(conn, force=args.force)
+    pool.close_all()
+    print(f"已导出到 {exporter.out_dir}：写入 {stats['written']} 个文件，未变 {stats['unchanged']}，"
+          f"移除 {stats['removed']}")
+    if stats['skipped']:
+        print(f"有 {stats['skipped']} 篇已发布文章还没有 HTML，先运行 python manage.py rerender")
+
+
+# ---------- 性能基准 ----------
+def cmd_bench_render(args):
+    import bench
+    bench.bench_render(args.iterations)
+
+
+def cmd_bench_markdown(args):
+    import bench
+    bench.bench_markdown(args.size_kb, args.iterations)
+
+
+def cmd_bench_storage(args):
+    import bench
+    bench.bench_storage(args.articles, args.iterations)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='班级网站管理命令')
+    parser.add_argument('--db', help='数据库文件路径，默认 database/class_site.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('migrate', help='执行数据库迁移')
+    p.add_argument('--target', type=int, default=None, help='目标版本号，默认最新')
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('db-status', help='查看数据库版本')
+    p.set_defaults(func=cmd_db_status)
+
+    p = sub.add_parser('backfill-visits', help='重建访问量汇总表')
+    p.set_defaults(func=cmd_backfill_visits)
+
+    p = sub.add_parser('rebuild-search', help='重建文章全文索引')
+    p.set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser('rerender', help='批量重新渲染文章 HTML')
+    p.add_argument('--workers', type=int, default=None, help='进程数，默认 CPU 核数')
+    p.add_argument('--force', action='store_true', help='忽略指纹，全部重新渲染')
+    p.set_defaults(func=cmd_rerender)
+
+    p = sub.add_parser('export-static', help='导出已发布文章的静态页面')
+    p.add_argument('--out', help='输出目录，默认 CLASS_SITE_EXPORT_DIR')
+    p.add_argument('--force', action='store_true', help='忽略 manifest，全部重写')
+    p.set_defaults(func=cmd_export_static)
+
+    p = sub.add_parser('bench-render', help='文章模板渲染基准')
+    p.add_argument('-n', '--iterations', type=int, default=500, help='渲染次数')
+    p.set_defaults(func=cmd_bench_render)
+
+    p = sub.add_parser('bench-markdown', help='Markdown 增量渲染正确性校验与基准')
+    p.add_argument('--size-kb', type=int, default=50, help='基准文档大小')
+    p.add_argument('-n', '--iterations', type=int, default=50, help='修改次数')
+    p.set_defaults(func=cmd_bench_markdown)
+
+    p = sub.add_parser('migrate-storage', help='在文件和 SQLite 之间迁移文章正文')
+    p.add_argument('--to', required=True, choices=['filesystem', 'sqlite'], help='目标存储后端')
+    p.add_argument('--delete-source', action='store_true', help='迁移完成后删除源后端中的正文')
+    p.set_defaults(func=cmd_migrate_storage)
+
+    p = sub.add_parser('bench-storage', help='文章正文存储后端读取基准')
+    p.add_argument('--articles', type=int, default=500, help='测试文章篇数')
+    p.add_argument('-n', '--iterations', type=int, default=5000, help='随机读取次数')
+    p.set_defaults(func=cmd_bench_storage)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# md_blocks.py
+"""按顶层块增量渲染 Markdown。
+
+Python-Markdown 先按空行把文档切成块再逐块解析，块之间只有少数情况互相影响：
+缩进开头的块会并入前面的代码块或列表项，列表项、引用开头的块会并入前面的列表、引用。
+这里按同样的规则把文档切成互不依赖的块组，每组的渲染结果按内容哈希缓存，
+修改文章时只有变化的块组需要重新渲染，拼接结果与整篇渲染一致。
+
+引用式链接定义、原始 HTML 块以及脚注等扩展会让块之间产生全局依赖，
+遇到这些情况直接整篇渲染。
+"""
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+import markdown
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+LIST_ITEM_RE = re.compile(r'^ {0,3}([*+-]|\d+\.)[ \t]+')
+# 引用式链接/脚注定义会影响其他块里的链接
+REFERENCE_RE = re.compile(r'^ {0,3}\[[^\]\n]+\]:', re.M)
+# 原始 HTML 块可能跨越空行
+HTML_BLOCK_RE = re.compile(r'^ {0,3}<', re.M)
+# 只作用于单个块的扩展，可以安全地按块渲染
+BLOCK_SAFE_EXTENSIONS = {'tables', 'fenced_code', 'sane_lists', 'nl2br'}
+
+
+def _extension_name(ext):
+    name = ext if isinstance(ext, str) else type(ext).__module__
+    return name.rsplit('.', 1)[-1]
+
+
+def split_blocks(text):
+    """把文档切成互不依赖的块组，返回各组的源文本"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    # (前面的空行数, 行列表)；代码块会保留内部空行的个数，所以要记下来
+    chunks = []
+    current = []
+    blanks = 0
+    fence = None
+    for line in lines:
+        if fence:
+            # 围栏代码块内部的空行不切分
+            current.append(line)
+            if line.rstrip() == fence:
+                fence = None
+            continue
+        if line.strip():
+            if not current:
+                chunks.append((blanks, current))
+                blanks = 0
+            current.append(line)
+            match = FENCE_RE.match(line)
+            if match:
+                fence = match.group(1)
+        else:
+            if current:
+                current = []
+            blanks += 1
+
+    groups = []
+    for blanks, chunk in chunks:
+        first = chunk[0]
+        depends_on_previous = (first[:1] in (' ', '\t') or first.lstrip().startswith('>')
+                               or LIST_ITEM_RE.match(first))
+        if groups and depends_on_previous:
+            groups[-1].extend([''] * blanks)
+            groups[-1].extend(chunk)
+        else:
+            groups.append(list(chunk))
+    return ['\n'.join(group) for group in groups]
+
+
+class BlockRenderer:
+
+    def __init__(self, extensions=(), max_blocks=4096):
+        self.extensions = list(extensions)
+        self.max_blocks = max_blocks
+        self.block_safe = all(_extension_name(ext) in BLOCK_SAFE_EXTENSIONS for ext in self.extensions)
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        # Markdown 实例不是线程安全的，每个线程一个
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.full_renders = 0
+
+    def _markdown(self):
+        md = getattr(self._local, 'md', None)
+        if md is None:
+            md = self._local.md = markdown.Markdown(extensions=self.extensions)
+        return md
+
+    def render_full(self, text):
+        return self._markdown().reset().convert(text)
+
+    def needs_full_render(self, text):
+        return not self.block_safe or bool(REFERENCE_RE.search(text) or HTML_BLOCK_RE.search(text))
+
+    def _render_block(self, block):
+        key = hashlib.sha256(block.encode('utf-8')).digest()
+        with self._lock:
+            html = self._blocks.get(key)
+            if html is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = self.render_full(block)
+        with self._lock:
+            self._blocks[key] = html
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return html
+
+    def render(self, text):
+        if self.needs_full_render(text):
+            self.full_renders += 1
+            return self.render_full(text)
+        return '\n'.join(html for html in map(self._render_block, split_blocks(text)) if html)
+
+    def mismatches(self, texts):
+        """正确性校验：返回增量渲染结果与整篇渲染不一致的文档下标"""
+        return [i for i, text in enumerate(texts) if self.render(text) != self.render_full(text)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'blocks': len(self._blocks),
+                'hits': self.hits,
+                'misses': self.misses,
+                'full_renders': self.full_renders
+            }
@@ -0,0 +1,556 @@
+# migrations.py
+"""数据库结构版本迁移。
+
+每个迁移是 MIGRATIONS 中的一项 (版本号, 说明, 函数)，按版本号顺序执行，
+已执行的版本记录在 schema_version 表中。命令行入口：python manage.py migrate
+
+迁移用到的表结构和数据处理都冻结在本文件里，不调用业务模块：
+业务代码以后改表结构或算法时，旧迁移在新旧数据库上的结果都不会跟着变。
+"""
+import os
+import re
+import json
+import math
+import zlib
+import hashlib
+import datetime
+from database_utils import db_connection
+import config
+
+# 文章正文文件目录，正文文件为 md/<文章ID>.md
+ARTICLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'articles')
+
+# 统一后的用户表结构：TEXT 主键 + 账号字段 + 个人主页字段
+USERS_COLUMNS = (
+    ('id', 'TEXT PRIMARY KEY'),
+    ('username', 'TEXT UNIQUE'),
+    ('display_name', 'TEXT'),
+    ('password', 'TEXT'),
+    ('level', 'INTEGER DEFAULT 1'),
+    ('phone', 'TEXT'),
+    ('email', 'TEXT'),
+    ('is_banned', 'INTEGER DEFAULT 0'),
+    ('last_login', 'TEXT'),
+    ('created_at', 'TEXT'),
+    ('is_online', 'INTEGER DEFAULT 0'),
+    ('version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('bio', 'TEXT'),
+    ('real_name', 'TEXT'),
+    ('gender', 'TEXT'),
+    ('grade', 'TEXT'),
+    ('class_info', 'TEXT'),
+    ('learning_hours', 'INTEGER DEFAULT 0'),
+    ('completed_projects', 'INTEGER DEFAULT 0'),
+    ('awards_won', 'INTEGER DEFAULT 0'),
+)
+
+
+def _table_columns(conn, table):
+    return {row[1]: (row[2] or '').upper() for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = _table_columns(conn, table)
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+
+
+def _read_md_file(article_id):
+    try:
+        with open(os.path.join(ARTICLES_DIR, 'md', f'{article_id}.md'), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _users_ddl(table):
+    columns = ',\n            '.join(f'{name} {decl}' for name, decl in USERS_COLUMNS)
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {columns}
+        )
+    '''
+
+
+# ---------- 0001 基础表结构 ----------
+def _0001_base_tables(conn):
+    conn.execute(_users_ddl('users'))
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS registration_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            display_name TEXT,
+            password TEXT,
+            phone TEXT,
+            email TEXT,
+            created_at TEXT,
+            status TEXT DEFAULT 'pending',
+            reviewed_by TEXT,
+            reviewed_at TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS system_settings (
+            setting_name TEXT UNIQUE,
+            setting_value TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            username TEXT,
+            operator_user_id TEXT,
+            operator_username TEXT,
+            action TEXT,
+            ip_address TEXT,
+            browser TEXT,
+            device_type TEXT,
+            access_time TEXT,
+            location TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS articles (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            content TEXT,
+            author_id TEXT,
+            author_name TEXT,
+            status TEXT DEFAULT 'draft',
+            created_at TEXT,
+            updated_at TEXT,
+            html_path TEXT,
+            md_path TEXT
+        )
+    ''')
+
+    # 默认系统设置：开放注册
+    conn.execute('''INSERT OR IGNORE INTO system_settings (setting_name, setting_value)
+                    VALUES ('registration_status', 'open')''')
+
+
+# ---------- 0002 统一 users 表结构 ----------
+def _0002_unify_users(conn):
+    """init_db.py 建出的 users 是 INTEGER 自增主键 + 个人资料字段，
+    database_utils 建出的是 TEXT 主键 + phone/is_online。统一重建为 USERS_COLUMNS，保留已有数据"""
+    existing = _table_columns(conn, 'users')
+    target = [name for name, _ in USERS_COLUMNS]
+    if list(existing) == target and existing['id'] == 'TEXT':
+        return
+
+    copy_columns = [name for name in target if name in existing]
+    select_exprs = ['CAST(id AS TEXT)' if name == 'id' else name for name in copy_columns]
+    # 旧结构用 registration_date 记录注册时间
+    if 'created_at' not in existing and 'registration_date' in existing:
+        copy_columns.append('created_at')
+        select_exprs.append('registration_date')
+
+    conn.execute('DROP TABLE IF EXISTS users_new')
+    conn.execute(_users_ddl('users_new'))
+    conn.execute(f'''
+        INSERT INTO users_new ({', '.join(copy_columns)})
+        SELECT {', '.join(select_exprs)} FROM users
+    ''')
+    conn.execute('DROP TABLE users')
+    conn.execute('ALTER TABLE users_new RENAME TO users')
+
+    # 另外两张表在早期版本里也缺过列
+    _add_missing_columns(conn, 'access_logs', (
+        ('operator_user_id', 'TEXT'),
+        ('operator_username', 'TEXT'),
+        ('action', 'TEXT'),
+        ('browser', 'TEXT'),
+        ('device_type', 'TEXT'),
+        ('location', 'TEXT'),
+    ))
+    _add_missing_columns(conn, 'articles', (
+        ('status', "TEXT DEFAULT 'draft'"),
+        ('html_path', 'TEXT'),
+        ('md_path', 'TEXT'),
+    ))
+
+    # 默认管理员
+    conn.execute('''INSERT OR IGNORE INTO users
+                    (id, username, display_name, password, level, phone, email, created_at, is_online)
+                    VALUES ('1', 'admin', '管理员', '111111', 6, '12345678901', 'admin@example.com', ?, 0)''',
+                 (datetime.datetime.now().isoformat(),))
+
+
+# ---------- 0003 热点查询索引 ----------
+def _0003_hot_path_indexes(conn):
+    # 访问日志按时间倒序列出、按时间范围统计
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_access_time ON access_logs(access_time)')
+    # 文章列表按创建时间倒序，可带状态筛选
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_status_created_at ON articles(status, created_at)')
+    # 注册申请按提交时间倒序
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_registration_requests_created_at ON registration_requests(created_at)')
+    # 成员列表的等级筛选与时间排序/筛选
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_level ON users(level)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_last_login ON users(last_login)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)')
+
+
+# ---------- 0004 访问量汇总表 ----------
+def _0004_visit_rollups(conn):
+    # 维度列用空字符串代替 NULL，否则主键冲突判断不会合并 NULL 行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS visit_daily (
+            day TEXT NOT NULL,
+            action TEXT NOT NULL DEFAULT '',
+            device_type TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, action, device_type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS visit_hourly (
+            hour TEXT NOT NULL,
+            action TEXT NOT NULL DEFAULT '',
+            device_type TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, action, device_type)
+        ) WITHOUT ROWID
+    ''')
+    # 用已有日志回填，之后由日志写入线程增量维护
+    conn.execute('''
+        INSERT OR REPLACE INTO visit_daily (day, action, device_type, count)
+        SELECT substr(access_time, 1, 10), COALESCE(action, ''), COALESCE(device_type, ''), COUNT(*)
+        FROM access_logs
+        WHERE access_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO visit_hourly (hour, action, device_type, count)
+        SELECT substr(access_time, 1, 13), COALESCE(action, ''), COALESCE(device_type, ''), COUNT(*)
+        FROM access_logs
+        WHERE access_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+
+
+# ---------- 0005 访问日志筛选索引 ----------
+def _0005_access_log_filter_indexes(conn):
+    # 单列索引隐含 rowid(id)，等值筛选 + id 倒序分页可以直接沿索引扫描
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_user_id ON access_logs(user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_username ON access_logs(username)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_action ON access_logs(action)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_ip_address ON access_logs(ip_address)')
+
+
+# ---------- 0006 文章全文索引 ----------
+def _0006_article_search(conn):
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            ref, title, author_name, body,
+            tokenize = 'trigram'
+        )
+    ''')
+    # 0010 之前正文只存在文件里
+    conn.execute('DELETE FROM articles_fts')
+    for article_id, title, author_name in conn.execute('SELECT id, title, author_name FROM articles').fetchall():
+        conn.execute('''
+            INSERT INTO articles_fts (rowid, ref, title, author_name, body) VALUES (?, ?, ?, ?, ?)
+        ''', (article_id, str(article_id), title or '', author_name or '', _read_md_file(article_id) or ''))
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+
+
+# ---------- 0007 文章渲染状态 ----------
+def _0007_article_render_status(conn):
+    # 已有文章的 HTML 文件是同步生成的，视为已渲染
+    _add_missing_columns(conn, 'articles', (('render_status', "TEXT DEFAULT 'ready'"),))
+
+
+# ---------- 0008 文章渲染指纹 ----------
+def _0008_article_render_fingerprint(conn):
+    # 为空表示未知，manage.py rerender 会重新渲染一次并补上
+    _add_missing_columns(conn, 'articles', (('render_fingerprint', 'TEXT'),))
+
+
+# ---------- 0009 文章历史版本 ----------
+def _0009_article_revisions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS revision_blobs (
+            hash TEXT PRIMARY KEY,
+            base_hash TEXT,
+            depth INTEGER NOT NULL DEFAULT 0,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL,
+            blob_hash TEXT NOT NULL,
+            title TEXT,
+            author_id TEXT,
+            author_name TEXT,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_revisions_article ON article_revisions(article_id, id)')
+    # 已有文章的当前正文（0010 之前只在文件里）作为第一个版本，存 zlib 压缩的完整正文
+    rows = conn.execute('SELECT id, title, author_id, author_name, updated_at FROM articles').fetchall()
+    for row in rows:
+        text = _read_md_file(row[0])
+        if text is None:
+            continue
+        data = text.encode('utf-8')
+        blob_hash = hashlib.sha256(data).hexdigest()
+        conn.execute('''
+            INSERT OR IGNORE INTO revision_blobs (hash, base_hash, depth, size, data) VALUES (?, NULL, 0, ?, ?)
+        ''', (blob_hash, len(data), zlib.compress(data)))
+        conn.execute('''
+            INSERT INTO article_revisions (article_id, blob_hash, title, author_id, author_name, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (row[0], blob_hash, row[1], row[2], row[3], row[4]))
+
+
+# ---------- 0010 文章正文 SQLite 存储 ----------
+def _0010_article_bodies(conn):
+    # 建表即可，正文仍在文件里，需要时用 manage.py migrate-storage 迁移
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_bodies (
+            article_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (article_id, kind)
+        ) WITHOUT ROWID
+    ''')
+
+
+# ---------- 0011 文章派生信息 ----------
+# 回填用的是 0011 时 article_meta.extract 的算法
+_META_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]')
+_META_WORD_RE = re.compile(r'[A-Za-z0-9\u00c0-\u024f]+(?:[\'\u2019.-][A-Za-z0-9\u00c0-\u024f]+)*')
+_META_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_META_ATX_HEADING_RE = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_META_SETEXT_RE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+_META_BLOCK_PREFIX_RE = re.compile(r'^ {0,3}(?:>[ \t]?)*(?:(?:[*+-]|\d+\.)[ \t]+)?')
+_META_HR_RE = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+_META_TABLE_RE = re.compile(r'^ {0,3}\|')
+_META_INLINE_RES = (
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'\[([^\]]*)\]\[[^\]]*\]'), r'\1'),
+    (re.compile(r'<[^>\n]+>'), ''),
+    (re.compile(r'(`+)(.+?)\1'), r'\2'),
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),
+    (re.compile(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1'), r'\2'),
+)
+
+
+def _meta_plain_text(line):
+    for pattern, repl in _META_INLINE_RES:
+        line = pattern.sub(repl, line)
+    return line.strip()
+
+
+def _meta_count_words(text):
+    return len(_META_CJK_RE.findall(text)), len(_META_WORD_RE.findall(_META_CJK_RE.sub(' ', text)))
+
+
+def _meta_extract(content):
+    """返回 (字数, 阅读分钟数, 目录 JSON, 摘要)"""
+    lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    cjk = words = 0
+    toc = []
+    excerpt = None
+    paragraph = []
+    fence = None
+
+    def end_paragraph():
+        nonlocal excerpt
+        if paragraph and excerpt is None:
+            excerpt = ' '.join(paragraph)
+        paragraph.clear()
+
+    for i, line in enumerate(lines):
+        if fence:
+            if line.rstrip() == fence:
+                fence = None
+            else:
+                c, w = _meta_count_words(line)
+                cjk, words = cjk + c, words + w
+            continue
+        match = _META_FENCE_RE.match(line)
+        if match:
+            end_paragraph()
+            fence = match.group(1)
+            continue
+        if not line.strip() or _META_HR_RE.match(line) and not paragraph:
+            end_paragraph()
+            continue
+
+        heading = _META_ATX_HEADING_RE.match(line)
+        if heading:
+            end_paragraph()
+            level, text = len(heading.group(1)), _meta_plain_text(heading.group(2) or '')
+            c, w = _meta_count_words(text)
+            cjk, words = cjk + c, words + w
+        elif paragraph and len(paragraph) == 1 and _META_SETEXT_RE.match(line) \
+                and not _META_TABLE_RE.match(lines[i - 1]):
+            level, text = (1 if line.strip()[0] == '=' else 2), paragraph.pop()
+        else:
+            text = _meta_plain_text(_META_BLOCK_PREFIX_RE.sub('', line, count=1))
+            c, w = _meta_count_words(text)
+            cjk, words = cjk + c, words + w
+            if text and not _META_TABLE_RE.match(line) and not line.startswith(('    ', '\t')):
+                paragraph.append(text)
+            continue
+
+        if text and len(toc) < 100:
+            toc.append({'level': level, 'text': text})
+    end_paragraph()
+
+    excerpt = excerpt or ''
+    if len(excerpt) > 120:
+        excerpt = excerpt[:120].rstrip() + '…'
+    minutes = cjk / 300 + words / 200
+    return (cjk + words, max(1, math.ceil(minutes)) if cjk + words else 0,
+            json.dumps(toc, ensure_ascii=False), excerpt)
+
+
+def _0011_article_meta(conn):
+    _add_missing_columns(conn, 'articles', (
+        ('word_count', 'INTEGER'),
+        ('reading_minutes', 'INTEGER'),
+        ('toc', 'TEXT'),
+        ('excerpt', 'TEXT'),
+    ))
+    # 用当前存储后端里的正文回填：sqlite 后端读 article_bodies 表，否则读文件
+    for (article_id,) in conn.execute('SELECT id FROM articles').fetchall():
+        if config.ARTICLE_STORAGE == 'sqlite':
+            row = conn.execute("SELECT data FROM article_bodies WHERE article_id = ? AND kind = 'md'",
+                               (article_id,)).fetchone()
+            text = zlib.decompress(row[0]).decode('utf-8') if row else None
+        else:
+            text = _read_md_file(article_id)
+        if text is not None:
+            conn.execute('''
+                UPDATE articles SET word_count = ?, reading_minutes = ?, toc = ?, excerpt = ? WHERE id = ?
+            ''', _meta_extract(text) + (article_id,))
+
+
+# ---------- 0012 文章阅读量 ----------
+def _0012_article_views(conn):
+    _add_missing_columns(conn, 'articles', (('views', 'INTEGER NOT NULL DEFAULT 0'),))
+    # 列表按阅读量排序，可带状态筛选
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_views ON articles(views)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_status_views ON articles(status, views)')
+
+
+# ---------- 0013 上传文件 ----------
+def _0013_uploads(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS uploaded_files (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mime TEXT NOT NULL,
+            filename TEXT,
+            uploader_id TEXT,
+            created_at TEXT
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            filename TEXT NOT NULL,
+            mime TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+# ---------- 0014 文章渲染错误信息 ----------
+def _0014_article_render_error(conn):
+    # 渲染失败时保存 {"code", "error"}，成功后清空
+    _add_missing_columns(conn, 'articles', (('render_error', 'TEXT'),))
+
+
+# ---------- 0015 版本 blob 引用索引 ----------
+def _0015_revision_blob_refs(conn):
+    # 删除文章时按这两列判断 blob 是否还被版本或其他 blob 引用
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_revisions_blob ON article_revisions(blob_hash)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_revision_blobs_base ON revision_blobs(base_hash)')
+
+
+MIGRATIONS = [
+    (1, '基础表结构', _0001_base_tables),
+    (2, '统一 users 表结构', _0002_unify_users),
+    (3, '热点查询索引', _0003_hot_path_indexes),
+    (4, '访问量汇总表', _0004_visit_rollups),
+    (5, '访问日志筛选索引', _0005_access_log_filter_indexes),
+    (6, '文章全文索引', _0006_article_search),
+    (7, '文章渲染状态', _0007_article_render_status),
+    (8, '文章渲染指纹', _0008_article_render_fingerprint),
+    (9, '文章历史版本', _0009_article_revisions),
+    (10, '文章正文 SQLite 存储', _0010_article_bodies),
+    (11, '文章字数、目录和摘要', _0011_article_meta),
+    (12, '文章阅读量', _0012_article_views),
+    (13, '上传文件', _0013_uploads),
+    (14, '文章渲染错误信息', _0014_article_render_error),
+    (15, '版本 blob 引用索引', _0015_revision_blob_refs),
+]
+
+
+# ---------- 执行 ----------
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def _apply(conn, target):
+    applied = []
+    for version, description, func in pending_migrations(conn):
+        if target is not None and version > target:
+            break
+        # 每个迁移单独一个事务，失败时整体回滚，不会留下半迁移状态
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            func(conn)
+            conn.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?,?,?)',
+                         (version, description, datetime.datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+
+def migrate(conn=None, target=None):
+    """把数据库升级到 target 版本（默认最新），返回本次执行的迁移列表"""
+    if conn is not None:
+        return _apply(conn, target)
+    with db_connection() as conn:
+        return _apply(conn, target)
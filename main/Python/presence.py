@@ -0,0 +1,96 @@
+# presence.py
+import time
+import atexit
+import threading
+import config
+
+
+class PresenceTracker:
+    """在线状态表，只保存在内存里。
+
+    登录和每次心跳把用户的过期时间推到 ttl 秒之后，登出时直接移除；
+    关掉页面不登出的用户停止心跳，ttl 秒后自然算作离线。
+    后台线程每隔 sweep_interval 秒清掉过期的记录，读在线状态时也会检查过期时间，
+    所以清理线程慢一点也不会把离线用户算成在线。
+    在线状态不写数据库，多进程部署时每个 worker 各自维护，需要单进程或粘性会话。
+    """
+
+    def __init__(self, ttl=90.0, sweep_interval=30.0):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._expires = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.heartbeats = 0
+        self.expired = 0
+        self.sweeps = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='presence-sweeper', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def touch(self, user_id):
+        """登录或心跳：标记为在线，返回过期时间（time.time() 秒）"""
+        self.start()
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._expires[str(user_id)] = expires_at
+            self.heartbeats += 1
+        return expires_at
+
+    def remove(self, user_id):
+        with self._lock:
+            self._expires.pop(str(user_id), None)
+
+    def is_online(self, user_id):
+        with self._lock:
+            return self._expires.get(str(user_id), 0) > time.time()
+
+    def online_ids(self):
+        now = time.time()
+        with self._lock:
+            return [user_id for user_id, expires_at in self._expires.items() if expires_at > now]
+
+    def count(self):
+        return len(self.online_ids())
+
+    def sweep(self):
+        """清掉已过期的记录，返回清掉的数量"""
+        now = time.time()
+        with self._lock:
+            stale = [user_id for user_id, expires_at in self._expires.items() if expires_at <= now]
+            for user_id in stale:
+                del self._expires[user_id]
+            self.expired += len(stale)
+            self.sweeps += 1
+        return len(stale)
+
+    def _run(self):
+        while not self._stopping.wait(self.sweep_interval):
+            self.sweep()
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                'online': sum(1 for expires_at in self._expires.values() if expires_at > now),
+                'tracked': len(self._expires),
+                'heartbeats': self.heartbeats,
+                'expired': self.expired,
+                'sweeps': self.sweeps
+            }
+
+
+presence = PresenceTracker(config.PRESENCE_TTL_SECONDS, config.PRESENCE_SWEEP_SECONDS)
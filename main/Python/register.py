@@ -2,8 +2,10 @@
 import sqlite3
 from flask import Blueprint, request, jsonify
 import datetime
-from database_utils import get_system_setting, update_system_setting, DB_PATH
+from database_utils import (get_system_setting, update_system_setting, insert_user, insert_user_in, db_connection,
+                            write_transaction)
 from log_activity import log_user_activity
+from site_stats import site_stats
 
 registration_bp = Blueprint('registration', __name__)
 
@@ -19,7 +21,7 @@ def handle_register():
 
     status = get_system_setting('registration_status', 'open')
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with db_connection() as conn:
         cur = conn.cursor()
 
         # 唯一性检查
@@ -30,23 +32,15 @@ def handle_register():
         if cur.fetchone():
             return jsonify({"error": "该用户名已提交过注册申请"}), 400
 
-        # 获取当前最大ID
-        cur.execute('SELECT MAX(id) FROM users')
-        max_id = cur.fetchone()[0]
-
-        # 添加类型转换处理
-        if max_id is not None:
-            max_id = int(max_id)  # 确保转换为整数
-        new_id = (max_id if max_id is not None else 0) + 1
-
         if status == 'open':
-            cur.execute('''
-                INSERT INTO users (id, username, display_name, password, level, phone, email, created_at, is_online)
-                VALUES (?,?,?,?,?,?,?,?,?)
-            ''', (new_id, username, display_name, password, 1, phone, email,
-                  datetime.datetime.now().isoformat(), 0))
-            conn.commit()
-            log_user_activity('Register', str(new_id), display_name, operator_user_id='Self', operator_username='Self')
+            # ID 在插入事务内分配，避免并发注册拿到相同ID
+            with site_stats.writing():
+                try:
+                    new_user = insert_user(username, display_name, password, level=1, phone=phone, email=email)
+                except sqlite3.IntegrityError:
+                    return jsonify({"error": "用户名已存在"}), 400
+                site_stats.user_added()
+            log_user_activity('Register', new_user['id'], display_name, operator_user_id='Self', operator_username='Self')
             return jsonify({"message": "注册成功"}), 201
 
         elif status == 'verify':
@@ -74,7 +68,7 @@ def update_registration_status():
 
 @registration_bp.route('/api/registration-requests', methods=['GET'])
 def list_requests():
-    with sqlite3.connect(DB_PATH) as conn:
+    with db_connection() as conn:
         cur = conn.cursor()
         cur.execute('SELECT id, username, display_name, created_at, status FROM registration_requests ORDER BY created_at DESC')
         rows = cur.fetchall()
@@ -87,26 +81,27 @@ def review(req_id):
     if action not in ('approve', 'reject'):
         return jsonify({"error": "操作无效"}), 400
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM registration_requests WHERE id = ?', (req_id,))
-        row = cur.fetchone()
-        if not row:
-            return jsonify({"error": "申请不存在"}), 404
+    # 审批状态和新用户在同一个写事务里提交：要么都成功，要么都回滚；
+    # 只更新仍是 pending 的申请，并发或重复审批时只有一个请求生效
+    with site_stats.writing():
+        try:
+            with write_transaction() as conn:
+                row = conn.execute('SELECT * FROM registration_requests WHERE id = ?', (req_id,)).fetchone()
+                if not row:
+                    return jsonify({"error": "申请不存在"}), 404
+
+                claimed = conn.execute('''
+                    UPDATE registration_requests SET status = ?, reviewed_by = ?, reviewed_at = ?
+                    WHERE id = ? AND status = 'pending'
+                ''', (action, 'admin', datetime.datetime.now().isoformat(), req_id)).rowcount
+                if not claimed:
+                    return jsonify({"error": "该申请已处理"}), 409
+
+                if action == 'approve':
+                    insert_user_in(conn, row[1], row[2], row[3], level=1, phone=row[4], email=row[5])
+        except sqlite3.IntegrityError:
+            return jsonify({"error": "用户名已存在"}), 400
 
         if action == 'approve':
-            # 获取当前最大ID
-            cur.execute('SELECT MAX(id) FROM users')
-            max_id = cur.fetchone()[0] or 0
-            new_id = max_id + 1
-
-            cur.execute('''
-                INSERT INTO users (id, username, display_name, password, level, phone, email, created_at)
-                VALUES (?,?,?,?,?,?,?,?)
-            ''', (new_id, row[1], row[2], row[3], 1, row[4], row[5], datetime.datetime.now().isoformat()))
-
-        cur.execute('UPDATE registration_requests SET status = ?, reviewed_by = ?, reviewed_at = ? WHERE id = ?',
-                   (action, 'admin', datetime.datetime.now().isoformat(), req_id))
-        conn.commit()
-
-        return jsonify({"message": f"已{action}"})
\ No newline at end of file
+            site_stats.user_added()
+    return jsonify({"message": f"已{action}"})
\ No newline at end of file
@@ -0,0 +1,206 @@
+# render_sandbox.py
+"""在独立进程里渲染 Markdown，限制单次渲染的时间、输入和输出大小。
+
+线程没法从外部中止，嵌套极深的列表或几 MB 的粘贴内容会让渲染线程一直占着。
+这里维护一组 spawn 方式启动的工作进程，每次渲染借用一个：
+- 输入超过 max_input_bytes 直接拒绝，不发给工作进程；
+- 超过 timeout 秒没有结果就杀掉该进程，下次用到时重新启动一个；
+- 输出超过 max_output_bytes、内存超限、递归过深都作为渲染失败返回；
+- 所有失败都抛出带错误代码的 RenderError，并记录耗时分布。
+工作进程里是常驻的 BlockRenderer，按块缓存同样有效。
+"""
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from collections import Counter, deque
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不限制内存
+    resource = None
+
+# 错误代码
+TOO_LARGE = 'too_large'
+OUTPUT_TOO_LARGE = 'output_too_large'
+TOO_COMPLEX = 'too_complex'
+TIMEOUT = 'timeout'
+BUSY = 'busy'
+CRASHED = 'crashed'
+ERROR = 'error'
+
+# 耗时分布按最近这么多次渲染计算
+DURATION_WINDOW = 1024
+
+
+class RenderError(Exception):
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def to_dict(self):
+        return {'code': self.code, 'error': self.message}
+
+
+def _worker_main(conn, extensions, max_output_bytes, memory_bytes):
+    """工作进程：循环接收 Markdown 文本，返回 (代码, HTML 或错误信息)"""
+    if memory_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    from md_blocks import BlockRenderer
+    renderer = BlockRenderer(extensions)
+    while True:
+        try:
+            text = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            html = renderer.render(text)
+        except MemoryError:
+            # 内存耗尽后进程状态不可靠，回复后退出，由主进程重新启动
+            conn.send((TOO_LARGE, '渲染占用内存超出限制'))
+            return
+        except RecursionError:
+            conn.send((TOO_COMPLEX, '文档嵌套层级过深'))
+            continue
+        except Exception as e:
+            conn.send((ERROR, str(e)))
+            continue
+        if len(html.encode('utf-8')) > max_output_bytes:
+            conn.send((OUTPUT_TOO_LARGE, f'渲染结果超过 {max_output_bytes} 字节'))
+        else:
+            conn.send(('ok', html))
+
+
+class _Worker:
+
+    def __init__(self, ctx, args):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,) + args,
+                                   name='markdown-render', daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class RenderSandbox:
+
+    def __init__(self, extensions=(), workers=2, timeout=10.0, max_input_bytes=2 * 1024 * 1024,
+                 max_output_bytes=8 * 1024 * 1024, memory_bytes=0):
+        self.timeout = timeout
+        self.max_input_bytes = max_input_bytes
+        self._worker_args = (list(extensions), max_output_bytes, memory_bytes)
+        self._ctx = multiprocessing.get_context('spawn')
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._started = False
+        self._durations = deque(maxlen=DURATION_WINDOW)
+        self.outcomes = Counter()
+        self.restarts = 0
+
+    def _checkout(self):
+        """取一个空闲的工作进程，已退出的丢弃，没有就启动一个"""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker.process.is_alive():
+                return worker
+            self._discard(worker)
+        worker = _Worker(self._ctx, self._worker_args)
+        with self._lock:
+            self._workers.add(worker)
+            if not self._started:
+                self._started = True
+                atexit.register(self.shutdown)
+        return worker
+
+    def _discard(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers.discard(worker)
+            self.restarts += 1
+
+    def _record(self, outcome, seconds):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self._durations.append(seconds)
+
+    def render(self, text):
+        """返回 Markdown 渲染出的 HTML 片段，失败抛出 RenderError"""
+        size = len(text.encode('utf-8'))
+        if size > self.max_input_bytes:
+            self._record(TOO_LARGE, 0.0)
+            raise RenderError(TOO_LARGE, f'正文 {size} 字节，超过渲染上限 {self.max_input_bytes} 字节')
+
+        started = time.perf_counter()
+        # 所有工作进程都忙时最多等待一个超时时间
+        if not self._slots.acquire(timeout=self.timeout):
+            self._record(BUSY, time.perf_counter() - started)
+            raise RenderError(BUSY, '渲染任务繁忙，请稍后重试')
+        outcome = ERROR
+        try:
+            worker = self._checkout()
+            try:
+                worker.conn.send(text)
+                if not worker.conn.poll(self.timeout):
+                    self._discard(worker)
+                    outcome = TIMEOUT
+                    raise RenderError(TIMEOUT, f'渲染超过 {self.timeout} 秒，已中止')
+                outcome, result = worker.conn.recv()
+            except (EOFError, OSError):
+                self._discard(worker)
+                outcome = CRASHED
+                raise RenderError(CRASHED, '渲染进程意外退出')
+            if outcome == TOO_LARGE:
+                # 内存超限的工作进程回复后就退出了，不放回空闲队列
+                self._discard(worker)
+            else:
+                self._idle.put(worker)
+            if outcome != 'ok':
+                raise RenderError(outcome, result)
+            return result
+        finally:
+            self._slots.release()
+            self._record(outcome, time.perf_counter() - started)
+
+    def stats(self):
+        with self._lock:
+            durations = sorted(self._durations)
+            stats = {
+                'workers': len(self._workers),
+                'restarts': self.restarts,
+                'outcomes': dict(self.outcomes)
+            }
+        if durations:
+            def percentile(p):
+                return round(durations[min(len(durations) - 1, int(len(durations) * p))] * 1000, 1)
+            stats['duration_ms'] = {
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(durations[-1] * 1000, 1)
+            }
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, set()
+        for worker in workers:
+            try:
+                worker.conn.close()
+                worker.process.join(1)
+                if worker.process.is_alive():
+                    worker.kill()
+            except Exception as e:
+                logging.warning(f'关闭渲染进程失败: {str(e)}')
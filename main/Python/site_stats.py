@@ -0,0 +1,216 @@
+# site_stats.py
+import time
+import atexit
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+from collections import Counter
+from database_utils import db_connection
+from visit_rollup import visits_on
+from presence import presence
+import config
+
+
+def _today():
+    return datetime.datetime.now().strftime('%Y-%m-%d')
+
+
+# 对账因写入进行中放弃时，隔多久重试
+RETRY_SECONDS = 1.0
+# 第一次加载最多尝试几次，都碰上写入时先用已累计的增减
+LOAD_ATTEMPTS = 20
+
+
+class SiteStats:
+    """站点统计计数，/api/stats 直接读内存。
+
+    注册人数、封禁人数、各状态的文章数和今日访问量由各写入路径在提交后增减，
+    在线人数读 presence。每次数值变化 version 加一，接口用它做 ETag。
+    增减和数据库之间可能有偏差（命令行直接改库、提交后进程崩溃等），
+    后台线程每隔 reconcile_interval 秒用几条聚合查询对账，以数据库为准覆盖内存里的值。
+
+    写入路径要把提交和随后的增减放在 writing() 里。对账查询期间只要有 writing() 进行过，
+    就无法判断查到的数据是否已包含这次写入、增减是否还会再加一次，这次对账直接放弃，稍后重试，
+    计数不会因为对账和增减重叠被重复计算。
+    """
+
+    def __init__(self, presence, reconcile_interval=300.0):
+        self.presence = presence
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._loaded = False
+        self._registered = 0
+        self._banned = 0
+        self._articles = Counter()
+        self._day = None
+        self._visits = 0
+        self._online = None
+        # 进行中的 writing() 个数；每次进入、退出都让 _write_seq 加一
+        self._writing = 0
+        self._write_seq = 0
+        self.version = 0
+        self.reconciles = 0
+        self.skipped = 0
+        self.corrections = 0
+        self.last_reconciled = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='site-stats-reconciler', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    # ---------- 写入路径调用 ----------
+    @contextmanager
+    def writing(self):
+        """包住会改变计数的提交和提交后的增减调用"""
+        with self._lock:
+            self._writing += 1
+            self._write_seq += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writing -= 1
+                self._write_seq += 1
+
+    def user_added(self, banned=False):
+        with self._lock:
+            self._registered += 1
+            self._banned += 1 if banned else 0
+            self.version += 1
+
+    def user_removed(self, banned=False):
+        with self._lock:
+            self._registered -= 1
+            self._banned -= 1 if banned else 0
+            self.version += 1
+
+    def user_banned(self, banned):
+        """封禁传 True，解封传 False"""
+        with self._lock:
+            self._banned += 1 if banned else -1
+            self.version += 1
+
+    def article_changed(self, old_status, new_status):
+        """新建时 old_status 为 None，删除时 new_status 为 None"""
+        if old_status == new_status:
+            return
+        with self._lock:
+            if old_status is not None:
+                self._articles[old_status] -= 1
+            if new_status is not None:
+                self._articles[new_status] += 1
+            self.version += 1
+
+    def add_visits(self, access_times):
+        """access_times 为刚写入的访问日志时间（ISO 格式），只累加今天的"""
+        today = _today()
+        count = sum(1 for access_time in access_times if (access_time or '')[:10] == today)
+        with self._lock:
+            self._roll_day(today)
+            if count:
+                self._visits += count
+                self.version += 1
+
+    def _roll_day(self, today):
+        # 调用方持有锁；跨天后今日访问量从 0 开始
+        if self._day != today:
+            self._day = today
+            self._visits = 0
+            self.version += 1
+
+    # ---------- 对账 ----------
+    def reconcile(self):
+        """按数据库重算全部计数，返回被修正的计数个数；查询期间有写入时放弃，返回 None"""
+        today = _today()
+        with self._lock:
+            if self._writing:
+                self.skipped += 1
+                return None
+            write_seq = self._write_seq
+        with db_connection() as conn:
+            registered, banned = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(is_banned != 0), 0) FROM users').fetchone()
+            # 状态为空的文章（PUT 未带 status）单独计为 unknown
+            articles = Counter({row[0] or 'unknown': row[1] for row in conn.execute(
+                'SELECT status, COUNT(*) FROM articles GROUP BY status')})
+        visits = visits_on(today)
+        with self._lock:
+            if self._writing or self._write_seq != write_seq:
+                self.skipped += 1
+                return None
+            self._roll_day(today)
+            current = (self._registered, self._banned, +self._articles, self._visits)
+            fresh = (registered, banned, articles, visits)
+            corrected = sum(1 for old, new in zip(current, fresh) if old != new)
+            self._registered, self._banned, self._articles, self._visits = fresh
+            if corrected:
+                self.version += 1
+                # 第一次加载不算修正
+                if self._loaded:
+                    self.corrections += corrected
+            self._loaded = True
+            self.reconciles += 1
+            self.last_reconciled = datetime.datetime.now().isoformat()
+        return corrected
+
+    def _run(self):
+        interval = self.reconcile_interval
+        while not self._stopping.wait(interval):
+            interval = self.reconcile_interval
+            try:
+                if self.reconcile() is None:
+                    interval = RETRY_SECONDS
+            except Exception as e:
+                logging.error(f'Error reconciling site stats: {str(e)}')
+
+    def shutdown(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---------- 读取 ----------
+    def snapshot(self):
+        """返回当前统计和版本号；只有进程里第一次调用会查询数据库"""
+        self.start()
+        for _ in range(LOAD_ATTEMPTS):
+            if self._loaded or self.reconcile() is not None:
+                break
+            time.sleep(0.01)
+        online = self.presence.count()
+        with self._lock:
+            self._roll_day(_today())
+            if online != self._online:
+                self._online = online
+                self.version += 1
+            articles = {status: count for status, count in self._articles.items() if count}
+            return {
+                "online_users": online,
+                "registered_users": self._registered,
+                "banned_users": self._banned,
+                "article_count": sum(articles.values()),
+                "articles": articles,
+                "today_visits": self._visits,
+                "version": self.version
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'reconciles': self.reconciles,
+                'skipped': self.skipped,
+                'corrections': self.corrections,
+                'last_reconciled': self.last_reconciled
+            }
+
+
+site_stats = SiteStats(presence, config.SITE_STATS_RECONCILE_SECONDS)
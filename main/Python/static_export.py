@@ -0,0 +1,182 @@
+# static_export.py
+"""把已发布的文章导出成静态站点，由 Web 服务器直接提供，不经过 Flask。
+
+输出目录结构：
+    index.html              文章列表第 1 页
+    page/<n>.html           文章列表第 n 页
+    articles/<id>.html      文章页面（渲染队列生成的 HTML）
+    *.gz                    每个页面预压缩的 gzip 版本（配合 nginx gzip_static）
+    manifest.json           每个文件的 SHA-256 和大小
+
+内容哈希与 manifest 相同的文件不重写，取消发布或删除的文章页面会被移除。
+全量导出：python manage.py export-static；文章渲染完成、删除或改标题后自动增量导出。
+"""
+import os
+import json
+import gzip
+import math
+import hashlib
+import logging
+import datetime
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from database_utils import db_connection
+
+PAGE_SIZE = 20
+MANIFEST_NAME = 'manifest.json'
+LIST_TEMPLATE = 'article_list.html'
+
+
+def _write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StaticExporter:
+
+    def __init__(self, out_dir, storage, render_template, page_size=PAGE_SIZE):
+        self.out_dir = out_dir
+        self.storage = storage
+        self.render_template = render_template
+        self.page_size = page_size
+        # 导出都在同一把锁里执行，manifest 的读-改-写不会交错
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _path(self, relpath):
+        return os.path.join(self.out_dir, *relpath.split('/'))
+
+    def _load_manifest(self):
+        try:
+            with open(self._path(MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'files': {}}
+
+    def _save_manifest(self, manifest):
+        manifest['generated_at'] = datetime.datetime.utcnow().isoformat()
+        _write_bytes(self._path(MANIFEST_NAME),
+                     json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8'))
+
+    def _put(self, manifest, relpath, text, stats):
+        """写入页面及其 .gz；内容与 manifest 记录相同且文件都在时跳过"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(relpath)
+        entry = manifest['files'].get(relpath)
+        if entry and entry['sha256'] == digest and os.path.exists(path) and os.path.exists(path + '.gz'):
+            stats['unchanged'] += 1
+            return
+        _write_bytes(path, data)
+        # mtime 固定为 0，相同内容压缩出的字节也相同
+        _write_bytes(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        manifest['files'][relpath] = {'sha256': digest, 'size': len(data)}
+        stats['written'] += 1
+
+    def _drop(self, manifest, relpath, stats):
+        if manifest['files'].pop(relpath, None) is not None:
+            stats['removed'] += 1
+        path = self._path(relpath)
+        _remove(path)
+        _remove(path + '.gz')
+
+    def _published(self, conn):
+        return conn.execute('''
+            SELECT id, title, author_name, created_at, excerpt, reading_minutes
+            FROM articles WHERE status = 'published' ORDER BY created_at DESC
+        ''').fetchall()
+
+    def _export_article(self, conn, manifest, article_id, published, stats):
+        relpath = f'articles/{article_id}.html'
+        body = self.storage.read(conn, article_id, 'html') if published else None
+        if body is None:
+            if published:
+                # 还没渲染出来，渲染完成后会再次导出
+                stats['skipped'] += 1
+            self._drop(manifest, relpath, stats)
+        else:
+            self._put(manifest, relpath, body.text, stats)
+
+    def _export_listings(self, manifest, rows, stats):
+        # 只列出已经导出页面的文章，列表里不会有死链接
+        rows = [dict(row) for row in rows if f"articles/{row['id']}.html" in manifest['files']]
+        pages = max(1, math.ceil(len(rows) / self.page_size))
+        listing = set()
+        for page in range(1, pages + 1):
+            relpath = 'index.html' if page == 1 else f'page/{page}.html'
+            listing.add(relpath)
+            html = self.render_template(
+                LIST_TEMPLATE,
+                articles=rows[(page - 1) * self.page_size:page * self.page_size],
+                page=page,
+                pages=pages,
+                root='' if page == 1 else '../'
+            )
+            self._put(manifest, relpath, html, stats)
+        for relpath in [p for p in manifest['files'] if p.startswith('page/') and p not in listing]:
+            self._drop(manifest, relpath, stats)
+
+    def export_all(self, conn, force=False):
+        """全量导出，返回 {'written', 'unchanged', 'removed', 'skipped'}；force 时忽略 manifest 全部重写"""
+        stats = Counter()
+        with self._lock:
+            manifest = {'files': {}} if force else self._load_manifest()
+            rows = self._published(conn)
+            published = {row['id'] for row in rows}
+            for article_id in published:
+                self._export_article(conn, manifest, article_id, True, stats)
+            for relpath in [p for p in manifest['files'] if p.startswith('articles/')]:
+                if int(relpath[len('articles/'):-len('.html')]) not in published:
+                    self._drop(manifest, relpath, stats)
+            self._export_listings(manifest, rows, stats)
+            self._save_manifest(manifest)
+        return {key: stats[key] for key in ('written', 'unchanged', 'removed', 'skipped')}
+
+    def sync_article(self, conn, article_id):
+        """增量导出一篇文章：已发布则写入页面，否则移除，然后更新列表页"""
+        stats = Counter()
+        with self._lock:
+            manifest = self._load_manifest()
+            rows = self._published(conn)
+            self._export_article(conn, manifest, article_id, any(row['id'] == article_id for row in rows), stats)
+            self._export_listings(manifest, rows, stats)
+            if stats['written'] or stats['removed']:
+                self._save_manifest(manifest)
+        return stats
+
+    def _run(self, article_id):
+        try:
+            with db_connection() as conn:
+                self.sync_article(conn, article_id)
+        except Exception as e:
+            logging.error(f"导出静态页面 {article_id} 失败: {str(e)}")
+
+    def submit(self, article_id):
+        """在后台线程里增量导出，不占用请求或渲染线程"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='static-export')
+            executor = self._executor
+        executor.submit(self._run, article_id)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
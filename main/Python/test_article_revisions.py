@@ -0,0 +1,48 @@
+# test_article_revisions.py
+import unittest
+from article_revisions import unified_diff
+
+
+class UnifiedDiffTest(unittest.TestCase):
+
+    def diff(self, old, new):
+        # 去掉 ---/+++ 两行文件头
+        return unified_diff(old, new, 'a', 'b').split('\n', 2)[2]
+
+    def test_changed_last_line_without_newline(self):
+        self.assertEqual(self.diff('body\nmore', 'body\nnew body'),
+                         '@@ -1,2 +1,2 @@\n'
+                         ' body\n'
+                         '-more\n'
+                         '\\ No newline at end of file\n'
+                         '+new body\n'
+                         '\\ No newline at end of file\n')
+
+    def test_newline_added_at_end(self):
+        self.assertEqual(self.diff('body\nmore', 'body\nmore\n'),
+                         '@@ -1,2 +1,2 @@\n'
+                         ' body\n'
+                         '-more\n'
+                         '\\ No newline at end of file\n'
+                         '+more\n')
+
+    def test_unchanged_last_line_without_newline(self):
+        self.assertEqual(self.diff('one\ntwo', 'ONE\ntwo'),
+                         '@@ -1,2 +1,2 @@\n'
+                         '-one\n'
+                         '+ONE\n'
+                         ' two\n'
+                         '\\ No newline at end of file\n')
+
+    def test_only_splits_on_newline(self):
+        self.assertEqual(self.diff('a\rb\n', 'a\rc\n'),
+                         '@@ -1 +1 @@\n'
+                         '-a\rb\n'
+                         '+a\rc\n')
+
+    def test_identical(self):
+        self.assertEqual(unified_diff('same', 'same', 'a', 'b'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
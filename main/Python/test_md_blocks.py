@@ -0,0 +1,87 @@
+# test_md_blocks.py
+import unittest
+import config
+from md_blocks import BlockRenderer, split_blocks
+
+CASES = {
+    'paragraphs': 'first paragraph\n\nsecond *paragraph*\n\n\n\nthird',
+    'loose_list': '- one\n\n- two\n\n- three\n\nafter',
+    'tight_then_loose_list': '- one\n- two\n\n- three',
+    'ordered_list': '1. one\n2. two\n\n3. three',
+    'nested_list': '- one\n    - nested\n    - nested again\n\n        deep paragraph\n- two',
+    'list_item_paragraphs': '- item\n\n    second paragraph of item\n\n- next',
+    'lazy_continuation': '- item\nlazy line\n\nparagraph',
+    'lazy_blockquote': '> quoted\nlazy line\n\nafter',
+    'indented_code': 'intro\n\n    code line\n\n    more code\n\n\n    after two blanks\n\ntext',
+    'code_after_list': '- item\n\n\n    code or item text\n\ntext',
+    'fenced_code_blank_lines': 'intro\n\n```\ncode\n\n\nmore code\n```\n\nafter',
+    'fenced_code_tildes': '~~~\na\n\n```\nb\n~~~\n\ntext',
+    'blockquote': '> one\n\n> two\n\n> > nested\n\nafter',
+    'setext_headings': 'Title\n=====\n\nSub\n---\n\ntext\n\nAnother\n-------',
+    'atx_headings': '# one\n\n## two ##\n\ntext',
+    'hr': 'text\n\n---\n\n* * *\n\nmore',
+    'table': 'a | b\n--- | ---\n1 | 2\n3 | 4\n\ntext after',
+    'table_after_paragraph': 'intro\n\n| a | b |\n|---|---|\n| 1 | 2 |',
+    'crlf': 'one\r\n\r\n- a\r\n- b\r\n\r\n    code\r\n',
+    'trailing_blanks': 'text\n\n\n',
+    'empty': '',
+}
+
+
+class BlockRendererMixin:
+    extensions = ()
+
+    def setUp(self):
+        self.renderer = BlockRenderer(self.extensions)
+
+    def assertSameAsFull(self, text):
+        self.assertEqual(self.renderer.render(text), self.renderer.render_full(text))
+
+    def test_cases(self):
+        for name, text in CASES.items():
+            with self.subTest(name):
+                self.assertSameAsFull(text)
+
+    def test_edit_then_rerender(self):
+        text = '\n\n'.join(CASES.values())
+        self.assertSameAsFull(text)
+        misses = self.renderer.stats()['misses']
+
+        # 只改一个段落：其余块组命中缓存，结果仍与整篇渲染一致
+        edited = text.replace('second *paragraph*', 'second **edited** paragraph')
+        self.assertSameAsFull(edited)
+        stats = self.renderer.stats()
+        self.assertEqual(stats['misses'], misses + 1)
+        self.assertGreater(stats['hits'], 0)
+
+        # 改动让后面的块并入列表，块组的划分随之变化
+        edited = edited.replace('\n\nafter', '\n\n    continued', 1)
+        self.assertSameAsFull(edited)
+        self.assertSameAsFull(text)
+
+    def test_global_dependencies_render_whole_document(self):
+        text = 'see [link][ref]\n\n[ref]: http://example.com\n\n<div>\n\nhtml\n\n</div>'
+        self.assertEqual(self.renderer.render(text), self.renderer.render_full(text))
+        self.assertEqual(self.renderer.stats()['full_renders'], 1)
+
+
+class DefaultExtensionsTest(BlockRendererMixin, unittest.TestCase):
+    extensions = ()
+
+
+class ConfiguredExtensionsTest(BlockRendererMixin, unittest.TestCase):
+    # 未配置时按常用的块级扩展测试
+    extensions = config.MARKDOWN_EXTENSIONS or ['tables', 'fenced_code']
+
+
+class SplitBlocksTest(unittest.TestCase):
+
+    def test_fenced_code_is_one_group(self):
+        self.assertEqual(split_blocks('```\na\n\nb\n```\n\ntext'), ['```\na\n\nb\n```', 'text'])
+
+    def test_indented_block_joins_previous_group(self):
+        self.assertEqual(split_blocks('- a\n\n\n    b\n\nc'), ['- a\n\n\n    b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
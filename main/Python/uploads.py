@@ -0,0 +1,360 @@
+# uploads.py
+"""文章图片和附件上传。
+
+- POST /api/upload：一次性表单上传（编辑器插入图片用，字段名 image 或 file）；
+- POST /api/uploads 创建断点续传会话，PATCH /api/uploads/<id> 带 Upload-Offset 头
+  按顺序追加原始字节，中断后 GET /api/uploads/<id> 查询已接收的字节数从那里继续；
+- GET /api/files/<hash> 按 SHA-256 读取文件，内容不会变，可以永久缓存。
+
+请求体按块流式写入磁盘，写入过程中检查大小上限；文件按内容哈希保存，
+同一个文件上传多次只保存一份。
+"""
+import os
+import time
+import secrets
+import hashlib
+import logging
+import datetime
+import mimetypes
+import threading
+from flask import Blueprint, request, jsonify, send_file, url_for, g
+from werkzeug.exceptions import RequestEntityTooLarge
+from database_utils import db_connection, write_transaction
+from auth import require_auth
+import config
+
+upload_bp = Blueprint('upload', __name__)
+
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOADS_DIR = os.path.join(base_dir, 'uploads')
+FILES_DIR = os.path.join(UPLOADS_DIR, 'files')
+PARTS_DIR = os.path.join(UPLOADS_DIR, 'parts')
+os.makedirs(FILES_DIR, exist_ok=True)
+os.makedirs(PARTS_DIR, exist_ok=True)
+
+CHUNK_SIZE = 64 * 1024
+# 未完成的会话超过这个时间没有新数据就清理
+SESSION_TTL_SECONDS = 24 * 3600
+# 浏览器里可以直接显示的类型，其他类型一律作为附件下载。SVG 可以带脚本，不直接显示
+INLINE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp', 'application/pdf', 'text/plain'}
+ALLOWED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg',
+    '.pdf', '.txt', '.md', '.zip', '.7z', '.rar',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx'
+}
+# 编辑器粘贴的图片通常没有扩展名，按浏览器给出的类型补上
+IMAGE_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/gif': '.gif', 'image/webp': '.webp'}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS uploaded_files (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mime TEXT NOT NULL,
+            filename TEXT,
+            uploader_id TEXT,
+            created_at TEXT
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            filename TEXT NOT NULL,
+            mime TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+# ---------- 文件 ----------
+def file_path(file_hash):
+    # 按哈希前两位分目录，避免单个目录文件过多
+    return os.path.join(FILES_DIR, file_hash[:2], file_hash)
+
+
+def part_path(session_id):
+    return os.path.join(PARTS_DIR, session_id + '.part')
+
+
+def check_filename(filename, mime=None):
+    """返回 (规范化的文件名, 推断的类型)；扩展名不允许时抛出 ValueError"""
+    filename = os.path.basename((filename or '').replace('\\', '/')).strip() or 'upload'
+    ext = os.path.splitext(filename)[1].lower()
+    if not ext and mime in IMAGE_EXTENSIONS:
+        ext = IMAGE_EXTENSIONS[mime]
+        filename += ext
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f'不支持的文件类型: {ext or "无扩展名"}')
+    # 类型按扩展名推断，不信任客户端给的 Content-Type
+    return filename, mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def copy_stream(stream, out, limit, digest=None):
+    """把 stream 按块写入 out，超过 limit 字节时抛出 UploadTooLarge，返回写入的字节数"""
+    written = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge()
+        out.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(tmp_path, file_hash, size, mime, filename, uploader_id):
+    """把已写完的临时文件登记为内容哈希对应的文件；已存在相同内容时丢弃临时文件。
+    返回是否命中了已有文件"""
+    target = file_path(file_hash)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    duplicate = os.path.exists(target)
+    if duplicate:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, target)
+    with write_transaction() as conn:
+        conn.execute('''
+            INSERT OR IGNORE INTO uploaded_files (hash, size, mime, filename, uploader_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (file_hash, size, mime, filename, uploader_id, datetime.datetime.utcnow().isoformat()))
+    return duplicate
+
+
+def file_info(file_hash, size, mime, filename, duplicate):
+    return {
+        'hash': file_hash,
+        'size': size,
+        'mime': mime,
+        'filename': filename,
+        'deduplicated': duplicate,
+        'url': url_for('upload.get_file', file_hash=file_hash, _external=True)
+    }
+
+
+@upload_bp.route('/api/upload', methods=['POST'])
+@require_auth(min_level=4)
+def upload_file():
+    """一次性上传，返回 {"url": ...}；大文件请用断点续传接口"""
+    limit = config.UPLOAD_MAX_BYTES
+    # 表单还有分隔符等少量额外字节，超出太多的请求不解析直接拒绝
+    if request.content_length is not None and request.content_length > limit + CHUNK_SIZE:
+        return jsonify({"error": "文件过大"}), 413
+    # 解析表单时 werkzeug 会把整个请求体读进临时文件；分块传输没有 Content-Length，
+    # 在读取过程中限制总字节数，超出时中止解析，不把超大的请求体完整缓冲下来
+    request.max_content_length = limit + CHUNK_SIZE
+    request.max_form_memory_size = CHUNK_SIZE
+
+    try:
+        upload = request.files.get('image') or request.files.get('file')
+    except RequestEntityTooLarge:
+        return jsonify({"error": "文件过大"}), 413
+    if upload is None:
+        return jsonify({"error": "没有上传文件"}), 400
+    try:
+        filename, mime = check_filename(upload.filename, upload.mimetype)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    digest = hashlib.sha256()
+    tmp_path = part_path('direct-' + secrets.token_hex(8))
+    try:
+        with open(tmp_path, 'wb') as out:
+            size = copy_stream(upload.stream, out, limit, digest)
+        file_hash = digest.hexdigest()
+        duplicate = store_file(tmp_path, file_hash, size, mime, filename, g.current_user.get('user_id'))
+    except UploadTooLarge:
+        return jsonify({"error": "文件过大"}), 413
+    except Exception as e:
+        logging.error(f"上传文件失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return jsonify(file_info(file_hash, size, mime, filename, duplicate)), 201
+
+
+# ---------- 断点续传 ----------
+# 同一个会话同时只允许一个请求写入
+_writing = set()
+_writing_lock = threading.Lock()
+
+
+def _session_json(row):
+    return {
+        'id': row['id'],
+        'filename': row['filename'],
+        'size': row['size'],
+        'offset': row['received'],
+        'chunk_size': CHUNK_SIZE * 16
+    }
+
+
+def _load_session(conn, session_id):
+    """返回当前用户的会话，不存在时返回 None"""
+    return conn.execute('SELECT * FROM upload_sessions WHERE id = ? AND user_id IS ?',
+                        (session_id, g.current_user.get('user_id'))).fetchone()
+
+
+def clean_stale_sessions(conn, now=None):
+    """删除长时间没有新数据的会话及其临时文件（不提交），返回删除的个数"""
+    now = now or time.time()
+    stale = [row[0] for row in conn.execute('SELECT id FROM upload_sessions WHERE updated_at < ?',
+                                            (now - SESSION_TTL_SECONDS,))]
+    for session_id in stale:
+        try:
+            os.remove(part_path(session_id))
+        except FileNotFoundError:
+            pass
+    conn.executemany('DELETE FROM upload_sessions WHERE id = ?', [(s,) for s in stale])
+    return len(stale)
+
+
+@upload_bp.route('/api/uploads', methods=['POST'])
+@require_auth(min_level=4)
+def create_upload_session():
+    """{"filename": 文件名, "size": 总字节数}，返回会话 ID 和已接收字节数"""
+    data = request.get_json(silent=True) or {}
+    size = data.get('size')
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({"error": "缺少文件大小"}), 400
+    if size > config.UPLOAD_MAX_BYTES:
+        return jsonify({"error": "文件过大"}), 413
+    try:
+        filename, mime = check_filename(data.get('filename'), data.get('mime'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    session_id = secrets.token_urlsafe(16)
+    open(part_path(session_id), 'wb').close()
+    with write_transaction() as conn:
+        clean_stale_sessions(conn)
+        conn.execute('''
+            INSERT INTO upload_sessions (id, user_id, filename, mime, size, received, updated_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?)
+        ''', (session_id, g.current_user.get('user_id'), filename, mime, size, time.time()))
+        row = _load_session(conn, session_id)
+    return jsonify(_session_json(row)), 201
+
+
+@upload_bp.route('/api/uploads/<session_id>', methods=['GET'])
+@require_auth(min_level=4)
+def get_upload_session(session_id):
+    with db_connection() as conn:
+        row = _load_session(conn, session_id)
+    if row is None:
+        return jsonify({"error": "上传会话不存在"}), 404
+    return jsonify(_session_json(row))
+
+
+@upload_bp.route('/api/uploads/<session_id>', methods=['PATCH'])
+@require_auth(min_level=4)
+def append_upload_chunk(session_id):
+    """请求体是从 Upload-Offset 开始的原始字节。偏移与服务器不一致时返回 409 和正确的偏移；
+    收齐全部字节后校验哈希、去重并返回文件信息"""
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({"error": "缺少 Upload-Offset 头"}), 400
+
+    with _writing_lock:
+        if session_id in _writing:
+            return jsonify({"error": "该会话正在上传"}), 409
+        _writing.add(session_id)
+    try:
+        with db_connection() as conn:
+            row = _load_session(conn, session_id)
+        if row is None:
+            return jsonify({"error": "上传会话不存在"}), 404
+        if offset != row['received']:
+            return jsonify({"error": "偏移不一致", "offset": row['received']}), 409
+
+        # 已写入的部分即使请求中途断开也记下来，客户端查询偏移后从那里继续
+        received = offset
+        too_large = False
+        try:
+            with open(part_path(session_id), 'r+b') as out:
+                # 丢掉上次没来得及记录的尾部
+                out.truncate(offset)
+                out.seek(offset)
+                try:
+                    copy_stream(request.stream, out, row['size'] - offset)
+                except UploadTooLarge:
+                    too_large = True
+                finally:
+                    received = out.tell()
+        finally:
+            with write_transaction() as conn:
+                conn.execute('UPDATE upload_sessions SET received = ?, updated_at = ? WHERE id = ?',
+                             (received, time.time(), session_id))
+        if too_large:
+            return jsonify({"error": "超出声明的文件大小", "offset": received}), 413
+        if received < row['size']:
+            return jsonify({'id': session_id, 'size': row['size'], 'offset': received})
+
+        # 收齐后整体计算哈希（哈希状态无法跨请求保存）
+        tmp_path = part_path(session_id)
+        file_hash = hash_file(tmp_path)
+        duplicate = store_file(tmp_path, file_hash, row['size'], row['mime'], row['filename'],
+                               g.current_user.get('user_id'))
+        with write_transaction() as conn:
+            conn.execute('DELETE FROM upload_sessions WHERE id = ?', (session_id,))
+        return jsonify(file_info(file_hash, row['size'], row['mime'], row['filename'], duplicate)), 201
+
+    except Exception as e:
+        logging.error(f"上传分块失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        with _writing_lock:
+            _writing.discard(session_id)
+
+
+@upload_bp.route('/api/uploads/<session_id>', methods=['DELETE'])
+@require_auth(min_level=4)
+def cancel_upload_session(session_id):
+    with write_transaction() as conn:
+        if _load_session(conn, session_id) is None:
+            return jsonify({"error": "上传会话不存在"}), 404
+        conn.execute('DELETE FROM upload_sessions WHERE id = ?', (session_id,))
+    try:
+        os.remove(part_path(session_id))
+    except FileNotFoundError:
+        pass
+    return jsonify({"message": "已取消上传"})
+
+
+# ---------- 读取 ----------
+@upload_bp.route('/api/files/<file_hash>', methods=['GET'])
+def get_file(file_hash):
+    if len(file_hash) != 64 or not all(c in '0123456789abcdef' for c in file_hash):
+        return jsonify({"error": "文件不存在"}), 404
+    with db_connection() as conn:
+        row = conn.execute('SELECT mime, filename FROM uploaded_files WHERE hash = ?', (file_hash,)).fetchone()
+    path = file_path(file_hash)
+    if row is None or not os.path.exists(path):
+        return jsonify({"error": "文件不存在"}), 404
+
+    # 地址由内容哈希决定，内容永远不会变
+    response = send_file(path, mimetype=row['mime'], conditional=True, etag=file_hash, max_age=31536000,
+                         as_attachment=row['mime'] not in INLINE_TYPES, download_name=row['filename'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
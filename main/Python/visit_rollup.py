@@ -0,0 +1,99 @@
+# visit_rollup.py
+"""访问量预聚合表：按天、按小时统计，维度为 action × device_type。
+
+访问日志写入时（见 log_activity.AccessLogWriter）在同一个事务里累加计数，
+控制台统计接口只读取 O(天数) 行汇总数据，不再扫描 access_logs。
+"""
+from collections import Counter
+from database_utils import db_connection
+
+UPSERT_DAILY_SQL = '''
+    INSERT INTO visit_daily (day, action, device_type, count) VALUES (?, ?, ?, ?)
+    ON CONFLICT(day, action, device_type) DO UPDATE SET count = count + excluded.count
+'''
+UPSERT_HOURLY_SQL = '''
+    INSERT INTO visit_hourly (hour, action, device_type, count) VALUES (?, ?, ?, ?)
+    ON CONFLICT(hour, action, device_type) DO UPDATE SET count = count + excluded.count
+'''
+
+
+def create_tables(conn):
+    # 维度列用空字符串代替 NULL，否则主键冲突判断不会合并 NULL 行
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS visit_daily (
+            day TEXT NOT NULL,
+            action TEXT NOT NULL DEFAULT '',
+            device_type TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, action, device_type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS visit_hourly (
+            hour TEXT NOT NULL,
+            action TEXT NOT NULL DEFAULT '',
+            device_type TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, action, device_type)
+        ) WITHOUT ROWID
+    ''')
+
+
+def apply_rollups(conn, records):
+    """records 是 access_logs 的插入参数元组，在调用方的事务里累加计数（不提交）"""
+    daily = Counter()
+    hourly = Counter()
+    for record in records:
+        action, device_type, access_time = record[4] or '', record[7] or '', record[8] or ''
+        # access_time 为 ISO 格式：前10位是日期，前13位精确到小时
+        daily[(access_time[:10], action, device_type)] += 1
+        hourly[(access_time[:13], action, device_type)] += 1
+    conn.executemany(UPSERT_DAILY_SQL, [key + (count,) for key, count in daily.items()])
+    conn.executemany(UPSERT_HOURLY_SQL, [key + (count,) for key, count in hourly.items()])
+
+
+def rebuild(conn):
+    """根据 access_logs 全量重建汇总表（不提交，由调用方控制事务）"""
+    conn.execute('DELETE FROM visit_daily')
+    conn.execute('DELETE FROM visit_hourly')
+    conn.execute('''
+        INSERT INTO visit_daily (day, action, device_type, count)
+        SELECT substr(access_time, 1, 10), COALESCE(action, ''), COALESCE(device_type, ''), COUNT(*)
+        FROM access_logs
+        WHERE access_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+    conn.execute('''
+        INSERT INTO visit_hourly (hour, action, device_type, count)
+        SELECT substr(access_time, 1, 13), COALESCE(action, ''), COALESCE(device_type, ''), COUNT(*)
+        FROM access_logs
+        WHERE access_time IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+
+
+def backfill(conn):
+    """命令行回填：在一个写事务内重建，期间新日志的写入会等待。返回 (汇总行数, 访问总数)"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rebuild(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return tuple(conn.execute('SELECT COUNT(*), COALESCE(SUM(count), 0) FROM visit_daily').fetchone())
+
+
+def daily_visits(start_day, end_day):
+    """返回 {日期: 访问量}，日期为 YYYY-MM-DD，包含首尾两天"""
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT day, SUM(count) FROM visit_daily
+            WHERE day >= ? AND day <= ?
+            GROUP BY day
+        ''', (start_day, end_day)).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def visits_on(day):
+    return daily_visits(day, day).get(day, 0)
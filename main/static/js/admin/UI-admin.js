@@ -394,7 +394,11 @@ function initPaginationListeners() {
 }
 document.addEventListener('DOMContentLoaded', function() {
     fetchDashboardStats(); // 立即更新一次
-    setInterval(fetchDashboardStats, 60000); // 每分钟更新一次
+    // 统计数据和最近活动由服务器推送；浏览器不支持或连接不上时退回定时刷新
+    startDashboardEvents(function() {
+        setInterval(fetchDashboardStats, 60000); // 每分钟更新一次
+        setInterval(fetchRecentActivities, 120000); // 每2分钟更新一次
+    });
 });
 function updateMembersTableWithSearch(data) {
     const tbody = document.querySelector('.members-table tbody');
@@ -533,9 +537,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 showNotification('活动数据已刷新', 'success');
             });
         }
-
-        // 每2分钟自动刷新活动数据
-        setInterval(fetchRecentActivities, 120000);
     }
 });
 document.querySelector('[href="#articles"]').addEventListener('click', function() {
@@ -476,6 +476,64 @@ async function fetchDashboardStats() {
         showNotification('无法获取控制台数据', 'error');
     }
 }
+// 控制台实时推送：统计数据和最近活动由服务器通过 SSE 推送，不再各自轮询
+let dashboardEvents = null;
+let dashboardStats = {};
+let recentActivityList = [];
+
+function applyDashboardStats(stats) {
+    Object.assign(dashboardStats, stats);
+    const fields = {
+        onlineUsers: 'online_users',
+        registeredUsers: 'registered_users',
+        articleCount: 'article_count',
+        todayVisits: 'today_visits'
+    };
+    Object.entries(fields).forEach(([elementId, key]) => {
+        const element = document.getElementById(elementId);
+        if (element && dashboardStats[key] !== undefined) {
+            element.textContent = dashboardStats[key];
+        }
+    });
+}
+
+function startDashboardEvents(onUnavailable) {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') {
+        onUnavailable();
+        return;
+    }
+    if (dashboardEvents) return;
+
+    // EventSource 断线后自动重连，并通过 Last-Event-ID 请求补发错过的事件
+    dashboardEvents = new EventSource('http://localhost:5000/api/admin/events?token=' + encodeURIComponent(token));
+
+    dashboardEvents.addEventListener('snapshot', function(event) {
+        const data = JSON.parse(event.data);
+        dashboardStats = {};
+        applyDashboardStats(data.stats);
+        recentActivityList = data.activities;
+        renderActivities(recentActivityList);
+    });
+
+    dashboardEvents.addEventListener('stats', function(event) {
+        applyDashboardStats(JSON.parse(event.data));
+    });
+
+    dashboardEvents.addEventListener('activity', function(event) {
+        recentActivityList = [JSON.parse(event.data)].concat(recentActivityList).slice(0, 5);
+        renderActivities(recentActivityList);
+    });
+
+    dashboardEvents.onerror = function() {
+        // 认证失败等情况下浏览器不再重连，退回定时刷新
+        if (dashboardEvents.readyState === EventSource.CLOSED) {
+            dashboardEvents = null;
+            onUnavailable();
+        }
+    };
+}
+
 async function renderVisitsChart() {
     try {
         const response = await fetch('http://localhost:5000/api/visits/weekly', {
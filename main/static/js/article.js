@@ -33,6 +33,15 @@ document.addEventListener('DOMContentLoaded', () => {
     // 从URL获取文章ID（如果是编辑页面）
     const urlParams = new URLSearchParams(window.location.search);
     const articleId = urlParams.get('id');
+
+    // 自动保存状态：服务器上当前的正文及其哈希，PATCH 只发送相对它的改动
+    const AUTOSAVE_DELAY = 2000;
+    let savedContent = null;
+    let baseHash = null;
+    let autosaveTimer = null;
+    let autosaving = false;
+    let autosaveConflict = false;
+
     if (articleId) {
         // 加载文章内容到编辑器
         loadArticleForEdit(articleId, editor);
@@ -120,6 +129,10 @@ document.addEventListener('DOMContentLoaded', () => {
             return response.json();
         })
         .then(data => {
+            if (data.hash) {
+                savedContent = content;
+                baseHash = data.hash;
+            }
             showNotification('草稿保存成功', 'success');
         })
         .catch(error => {
@@ -128,6 +141,80 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // 计算从 oldText 到 newText 的单个替换区间（公共前缀、后缀之外的部分），下标为 JS 字符串下标
+    function computeSplice(oldText, newText) {
+        let start = 0;
+        const minLength = Math.min(oldText.length, newText.length);
+        while (start < minLength && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+            start++;
+        }
+        let oldEnd = oldText.length;
+        let newEnd = newText.length;
+        while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+            oldEnd--;
+            newEnd--;
+        }
+        // 不把代理对（如表情符号）切成两半
+        if (start > 0) {
+            const code = oldText.charCodeAt(start - 1);
+            if (code >= 0xD800 && code <= 0xDBFF) start--;
+        }
+        if (oldEnd < oldText.length) {
+            const code = oldText.charCodeAt(oldEnd);
+            if (code >= 0xDC00 && code <= 0xDFFF) {
+                oldEnd++;
+                newEnd++;
+            }
+        }
+        return { start: start, end: oldEnd, text: newText.slice(start, newEnd) };
+    }
+
+    function scheduleAutosave() {
+        clearTimeout(autosaveTimer);
+        autosaveTimer = setTimeout(autosave, AUTOSAVE_DELAY);
+    }
+
+    // 停止输入一段时间后把改动的片段 PATCH 到服务器
+    function autosave() {
+        if (!articleId || baseHash === null || autosaveConflict) return;
+        if (autosaving) {
+            scheduleAutosave();
+            return;
+        }
+        const content = editor.getMarkdown();
+        if (!content || content === savedContent) return;
+
+        autosaving = true;
+        fetch(`http://localhost:5000/api/articles/${articleId}`, {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': 'Bearer ' + localStorage.getItem('token')
+            },
+            body: JSON.stringify({ base_hash: baseHash, ops: [computeSplice(savedContent, content)] })
+        })
+        .then(response => response.json().then(data => ({ status: response.status, data: data })))
+        .then(({ status, data }) => {
+            if (status === 409) {
+                // 文章在别处被修改过，继续自动保存会覆盖别人的修改
+                autosaveConflict = true;
+                showNotification('文章已在其他地方被修改，请刷新页面后再编辑', 'error');
+                return;
+            }
+            if (status !== 200) throw new Error(data.error || '自动保存失败');
+            savedContent = content;
+            baseHash = data.hash;
+        })
+        .catch(error => {
+            console.error('自动保存失败:', error);
+        })
+        .finally(() => {
+            autosaving = false;
+        });
+    }
+
+    editor.on('change', scheduleAutosave);
+
     // 加载文章用于编辑
     function loadArticleForEdit(articleId, editor) {
         fetch(`http://localhost:5000/api/articles/${articleId}/raw-md`, {
@@ -141,6 +228,8 @@ document.addEventListener('DOMContentLoaded', () => {
         })
         .then(data => {
             editor.setMarkdown(data.content);
+            savedContent = data.content;
+            baseHash = data.hash;
             // 获取文章标题
             return fetch(`http://localhost:5000/api/articles/${articleId}`, {
                 headers: {
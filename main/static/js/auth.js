@@ -60,6 +60,8 @@ async function checkAuth() {
             if (document.getElementById('logoutBtn')) {
                 document.getElementById('logoutBtn').style.display = 'inline-block';
             }
+
+            startPresenceHeartbeat();
         } else {
             // 令牌无效，清除令牌并重定向
             localStorage.removeItem('token');
@@ -109,6 +111,35 @@ async function checkAuth() {
         }
     }
 }
+// 在线心跳：页面打开期间定时上报，关闭页面后服务器超时自动算作离线
+const PRESENCE_HEARTBEAT_MS = 30000;
+let presenceTimer = null;
+
+function sendPresenceHeartbeat() {
+    const token = localStorage.getItem('token');
+    if (!token) {
+        clearInterval(presenceTimer);
+        presenceTimer = null;
+        return;
+    }
+    fetch('http://localhost:5000/api/presence/heartbeat', {
+        method: 'POST',
+        headers: { 'Authorization': 'Bearer ' + token }
+    }).catch(error => console.error('在线心跳失败:', error));
+}
+
+function startPresenceHeartbeat() {
+    if (presenceTimer) return;
+    sendPresenceHeartbeat();
+    presenceTimer = setInterval(function() {
+        // 后台标签页不上报，切回来时立即补一次
+        if (!document.hidden) sendPresenceHeartbeat();
+    }, PRESENCE_HEARTBEAT_MS);
+    document.addEventListener('visibilitychange', function() {
+        if (!document.hidden) sendPresenceHeartbeat();
+    });
+}
+
 // 显示当前登录用户
 async function displayCurrentUser() {
     try {